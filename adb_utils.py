@@ -0,0 +1,428 @@
+import codecs
+import os
+import subprocess
+import sys
+import threading
+import zlib
+
+# APK locations that mark a package as a system (pre-installed) app
+SYSTEM_APK_PREFIXES = (
+    '/system/app/',
+    '/system/priv-app/',
+    '/vendor/app/',
+    '/product/app/',
+    '/data/app/~~/',
+)
+
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Shell snippet printing the first gzip implementation that works on the device, or nothing
+_DETECT_COMPRESSOR_SCRIPT = \
+    "for c in gzip 'toybox gzip'; do if echo ok | $c -c >/dev/null 2>&1; then echo \"$c\"; break; fi; done"
+
+# (adb_path, serial) -> gzip command on that device, or None when it has none
+_compressor_cache = {}
+# Running totals of streamed output, see get_transfer_totals()
+_transfer_totals = {'commands': 0, 'compressed_commands': 0, 'wire_bytes': 0, 'text_bytes': 0}
+_cache_lock = threading.Lock()
+
+
+class AdbError(Exception):
+    """Raised when adb is missing, fails or times out."""
+
+
+class CompressedStreamError(AdbError):
+    """Raised when gzip output from the device can't be decompressed; retrying uncompressed may work."""
+
+
+# --- resource_path function ---
+def resource_path(relative_path):
+    """
+    Get the absolute path to a resource, useful for PyInstaller.
+    This function expects relative_path to be a valid string, not None.
+    """
+    try:
+        # PyInstaller creates a temp folder and stores path in _MEIPASS
+        base_path = sys._MEIPASS
+    except AttributeError:
+        base_path = os.path.abspath(".")
+
+    return os.path.join(base_path, relative_path)
+
+
+def get_tool_path(tool_name):
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    final_tool_path = None
+    exe_name = f"{tool_name}.exe" if sys.platform == "win32" else tool_name
+
+    candidate_path_specific_folder = os.path.join(script_dir, tool_name, exe_name)
+    if os.path.exists(candidate_path_specific_folder) and os.path.isfile(candidate_path_specific_folder):
+        final_tool_path = candidate_path_specific_folder
+        print(f"[DEBUG] Trying: {final_tool_path}")
+
+    if final_tool_path is None:
+        print(f"[DEBUG] {tool_name} not found in specific folder. Checking system PATH...")
+        try:
+            check_cmd = ['where', tool_name] if sys.platform == "win32" else ['which', tool_name]
+            result = subprocess.run(check_cmd, capture_output=True, text=True, check=False, timeout=5)
+            if result.returncode == 0:
+                final_tool_path = result.stdout.strip()
+                print(f"[DEBUG] Found {tool_name} at: {final_tool_path} (in system PATH)")
+            else:
+                print(f"[DEBUG] 'where'/'which' command failed for {tool_name}. Stderr: {result.stderr.strip()}")
+        except (subprocess.CalledProcessError, FileNotFoundError, subprocess.TimeoutExpired) as e:
+            print(f"[DEBUG] Error trying 'where'/'which' for {tool_name}: {e}")
+
+    if final_tool_path:
+        try:
+            print(f"[DEBUG] Verifying executability of {final_tool_path}...")
+            test_cmd = [final_tool_path]
+            if tool_name == "adb":
+                test_cmd.append("version")
+
+            process = subprocess.Popen(test_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            stdout, stderr = process.communicate(timeout=5)
+
+            print(f"[DEBUG] {tool_name} test command stdout: {stdout.decode().strip()}")
+            print(f"[DEBUG] {tool_name} test command stderr: {stderr.decode().strip()}")
+            print(f"[DEBUG] {tool_name} test command return code: {process.returncode}")
+
+            if process.returncode != 0 and \
+                    not (b"version" in stdout.lower() or b"usage" in stdout.lower() or b"usage" in stderr.lower()):
+                print(
+                    f"Warning: {tool_name} found at {final_tool_path} but failed initial execution test. It might not be truly executable or compatible.")
+                final_tool_path = None
+
+        except (FileNotFoundError, subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+            print(f"Warning: {tool_name} found at {final_tool_path} but failed to execute test command: {e}")
+            final_tool_path = None
+
+    if not final_tool_path:
+        print(f"!!! {tool_name} not found or not executable. !!!")
+        print(f"Please ensure {tool_name} is correctly installed and accessible.")
+        return None
+
+    return resource_path(final_tool_path)
+
+
+def run_adb(adb_path, args, timeout):
+    """Run an adb command and return the CompletedProcess, raising AdbError if it cannot run."""
+    if not adb_path:
+        raise AdbError("ADB not found. Check console.")
+
+    adb_command = [adb_path] + list(args)
+    print(f"[DEBUG] Running ADB command: {' '.join(adb_command)}")
+    try:
+        return subprocess.run(adb_command, capture_output=True, text=True, check=False, timeout=timeout)
+    except subprocess.TimeoutExpired as e:
+        print(f"ADB command '{' '.join(args)}' timed out: {e}")
+        raise AdbError(f"ADB command '{' '.join(args)}' timed out.")
+    except OSError as e:
+        print(f"An unexpected error occurred while running ADB: {e}")
+        raise AdbError(f"Error running ADB: {e}")
+
+
+def get_device_compressor(adb_path, device_serial):
+    """Return the gzip command available on the device ('gzip' or 'toybox gzip'), or None."""
+    key = (adb_path, device_serial)
+    with _cache_lock:
+        if key in _compressor_cache:
+            return _compressor_cache[key]
+
+    try:
+        process = run_adb(adb_path, ["-s", device_serial, "shell", _DETECT_COMPRESSOR_SCRIPT], timeout=10)
+    except AdbError as e:
+        print(f"[DEBUG] Compressor detection on {device_serial} failed, will retry next time: {e}")
+        return None
+    if process.returncode != 0:
+        # Offline, still booting or an adb hiccup: don't remember this as 'no gzip'
+        print(f"[DEBUG] Compressor detection on {device_serial} failed, will retry next time: "
+              f"{process.stderr.strip()[:100]}")
+        return None
+
+    compressor = process.stdout.strip()
+    if compressor not in ("gzip", "toybox gzip"):
+        compressor = None
+    print(f"[DEBUG] Compressor on {device_serial}: {compressor}")
+
+    with _cache_lock:
+        _compressor_cache[key] = compressor
+    return compressor
+
+
+def get_transfer_totals():
+    """Return running totals of streamed command output, including the bytes compression saved."""
+    with _cache_lock:
+        totals = dict(_transfer_totals)
+    totals['saved_bytes'] = max(totals['text_bytes'] - totals['wire_bytes'], 0)
+    return totals
+
+
+def stream_shell_lines(adb_path, device_serial, shell_command, timeout, stats=None, compress=True):
+    """
+    Run a shell command on the device and yield its output line by line as it arrives.
+
+    When the device has gzip the output is compressed there, sent with exec-out (binary safe)
+    and decompressed incrementally here, so large output is never held in memory at once.
+    Otherwise (or with compress=False) it uses plain `adb shell` text. If decompression fails
+    before any line was yielded it retries once as plain text; if it fails later,
+    CompressedStreamError is raised so the caller can start over with compress=False.
+    If a dict is passed as stats it is filled with the transfer metrics once the stream is exhausted.
+    """
+    if not adb_path:
+        raise AdbError("ADB not found. Check console.")
+
+    compressor = get_device_compressor(adb_path, device_serial) if compress else None
+    if not compressor:
+        yield from _stream_lines(adb_path, device_serial, shell_command, None, timeout, stats)
+        return
+
+    yielded = False
+    try:
+        for line in _stream_lines(adb_path, device_serial, shell_command, compressor, timeout, stats):
+            yielded = True
+            yield line
+    except CompressedStreamError as e:
+        if yielded:
+            raise
+        print(f"[DEBUG] {e} Retrying '{shell_command}' as plain text.")
+        yield from _stream_lines(adb_path, device_serial, shell_command, None, timeout, stats)
+
+
+def _stream_lines(adb_path, device_serial, shell_command, compressor, timeout, stats):
+    if compressor:
+        # exec-out has no separate stderr channel, so keep the command's stderr out of the gzip bytes
+        args = ["-s", device_serial, "exec-out", f"{{ {shell_command}; }} 2>/dev/null | {compressor} -c"]
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)  # gzip framing
+    else:
+        args = ["-s", device_serial, "shell", shell_command]
+        decompressor = None
+
+    adb_command = [adb_path] + args
+    print(f"[DEBUG] Streaming ADB command: {' '.join(adb_command)}")
+    try:
+        process = subprocess.Popen(adb_command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError as e:
+        print(f"An unexpected error occurred while running ADB: {e}")
+        raise AdbError(f"Error running ADB: {e}")
+
+    # Drain stderr on the side so a chatty device can't block the stdout pipe
+    stderr_chunks = []
+    stderr_thread = threading.Thread(target=lambda: stderr_chunks.append(process.stderr.read()))
+    stderr_thread.daemon = True
+    stderr_thread.start()
+
+    timed_out = threading.Event()
+
+    def kill_on_timeout():
+        timed_out.set()
+        process.kill()
+
+    timer = threading.Timer(timeout, kill_on_timeout)
+    timer.start()
+
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    wire_bytes = 0
+    text_bytes = 0
+    pending = ""
+    try:
+        while True:
+            chunk = process.stdout.read1(STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            wire_bytes += len(chunk)
+            if decompressor:
+                try:
+                    chunk = decompressor.decompress(chunk)
+                except zlib.error as e:
+                    raise CompressedStreamError(f"Corrupt compressed output from '{shell_command}': {e}.")
+            text_bytes += len(chunk)
+
+            pending += decoder.decode(chunk)
+            lines = pending.split("\n")
+            pending = lines.pop()
+            for line in lines:
+                yield line.rstrip("\r")
+
+        if decompressor:
+            tail = decompressor.flush()
+            text_bytes += len(tail)
+            pending += decoder.decode(tail)
+        pending += decoder.decode(b"", final=True)
+        # A truncated gzip stream ends mid-line; that fragment isn't a line, the error below reports it
+        if pending and not (decompressor and not decompressor.eof):
+            yield pending.rstrip("\r")
+
+        process.wait()
+        stderr_thread.join()
+    finally:
+        timer.cancel()
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+
+    if timed_out.is_set():
+        print(f"ADB command '{shell_command}' timed out after {timeout}s.")
+        raise AdbError(f"ADB command '{shell_command}' timed out.")
+
+    stderr_text = b"".join(stderr_chunks).decode("utf-8", errors="replace").strip()
+    if process.returncode != 0:
+        print(f"Error executing '{shell_command}': {stderr_text}")
+        raise AdbError(f"ADB error: {stderr_text[:100]}...")
+    if decompressor and not decompressor.eof:
+        # exec-out doesn't forward the exit status, so a truncated gzip stream is the failure signal
+        raise CompressedStreamError(f"Incomplete compressed output from '{shell_command}': {stderr_text[:100]}")
+
+    saved_bytes = max(text_bytes - wire_bytes, 0)
+    print(f"[DEBUG] '{shell_command}' on {device_serial}: {wire_bytes} bytes transferred, "
+          f"{text_bytes} bytes of text, {saved_bytes} bytes saved by compression.")
+    with _cache_lock:
+        _transfer_totals['commands'] += 1
+        _transfer_totals['compressed_commands'] += 1 if decompressor else 0
+        _transfer_totals['wire_bytes'] += wire_bytes
+        _transfer_totals['text_bytes'] += text_bytes
+    if stats is not None:
+        stats.update({'compressed': decompressor is not None, 'wire_bytes': wire_bytes,
+                      'text_bytes': text_bytes, 'saved_bytes': saved_bytes})
+
+
+def get_adb_device_states(adb_path):
+    """Return {serial: state} for every transport `adb devices` lists (device, offline, unauthorized, ...)."""
+    process = run_adb(adb_path, ["devices"], timeout=10)
+
+    print(f"[DEBUG] ADB devices stdout:\n{process.stdout.strip()}")
+    print(f"[DEBUG] ADB devices stderr:\n{process.stderr.strip()}")
+    print(f"[DEBUG] ADB devices return code: {process.returncode}")
+
+    if process.returncode != 0:
+        print(f"Error executing 'adb devices': {process.stderr.strip()}")
+        raise AdbError(f"ADB error: {process.stderr.strip()[:100]}...")
+
+    states = {}
+    lines = process.stdout.strip().split('\n')
+    for line in lines[1:]:
+        parts = line.split('\t')
+        if len(parts) >= 2:
+            states[parts[0].strip()] = parts[1].strip()
+    return states
+
+
+def get_adb_devices(adb_path):
+    """Return the serials of all devices in the 'device' state."""
+    devices = [serial for serial, state in get_adb_device_states(adb_path).items() if state == "device"]
+    print(f"[DEBUG] Found devices: {devices}")
+    return devices
+
+
+def parse_package_list(lines):
+    """Parse `pm list packages -f` output lines into a list of app dicts."""
+    all_apps = []
+    for line in lines:
+        if line.startswith("package:"):
+            parts = line.strip().split("=", 1)
+            if len(parts) == 2:
+                apk_path_full = parts[0].replace("package:", "")
+                package_name = parts[1]
+                all_apps.append({'package_name': package_name, 'apk_path': apk_path_full})
+    return all_apps
+
+
+def categorize_apps(all_apps):
+    """Split app dicts into {'external': [...], 'system': [...]} by APK location."""
+    external_apps = []
+    system_apps = []
+    for app in all_apps:
+        if app['apk_path'].startswith(SYSTEM_APK_PREFIXES):
+            system_apps.append(app)
+        else:
+            external_apps.append(app)
+    return {'external': external_apps, 'system': system_apps}
+
+
+def get_installed_apps(adb_path, device_serial):
+    # Parsed as it streams in; the raw listing is never buffered or echoed to the console
+    try:
+        lines = stream_shell_lines(adb_path, device_serial, "pm list packages -f", timeout=60)
+        apps = categorize_apps(parse_package_list(lines))
+    except CompressedStreamError as e:
+        # The gzip stream broke after some lines were parsed: start over as plain text
+        print(f"[DEBUG] {e} Listing packages on {device_serial} again without compression.")
+        lines = stream_shell_lines(adb_path, device_serial, "pm list packages -f", timeout=60, compress=False)
+        apps = categorize_apps(parse_package_list(lines))
+    print(
+        f"[DEBUG] get_installed_apps returning {len(apps['external'])} external and {len(apps['system'])} system apps.")
+    return apps
+
+
+def uninstall_package(adb_path, device_serial, package_name):
+    """Uninstall a package, returning (success, message)."""
+    print(f"[DEBUG_BACKGROUND] Attempting to uninstall {package_name} from {device_serial}...")
+    process = run_adb(adb_path, ["-s", device_serial, "uninstall", package_name], timeout=60)
+
+    print(f"[DEBUG_BACKGROUND] Uninstall stdout:\n{process.stdout.strip()}")
+    print(f"[DEBUG_BACKGROUND] Uninstall stderr:\n{process.stderr.strip()}")
+    print(f"[DEBUG_BACKGROUND] Uninstall return code: {process.returncode}")
+
+    if process.returncode == 0 and "Success" in process.stdout:
+        print(f"Uninstallation successful for {package_name}.")
+        return True, f"Successfully deleted {package_name}!"
+
+    error_message = process.stderr.strip() if process.stderr else process.stdout.strip() if process.stdout else "Unknown error."
+    if not error_message: error_message = "Failed with no specific output."
+    print(
+        f"Uninstallation failed for {package_name}. Full Stderr: {process.stderr}, Full Stdout: {process.stdout}")
+    return False, f"Failed to delete {package_name}: {error_message[:100]}..."
+
+
+def get_package_list_digest(adb_path, device_serial):
+    """
+    Hash `pm list packages -f` on the device itself so only 32 hex chars cross the wire.
+    Returns None if the device has no md5sum (callers then fall back to a full listing).
+    """
+    process = run_adb(adb_path, ["-s", device_serial, "shell", "pm list packages -f | md5sum"], timeout=30)
+    if process.returncode != 0:
+        raise AdbError(f"ADB digest error: {process.stderr.strip()[:100]}...")
+
+    fields = process.stdout.split()
+    digest = fields[0].lower() if fields else ""
+    if len(digest) != 32 or any(c not in "0123456789abcdef" for c in digest):
+        print(f"[DEBUG] md5sum unavailable on {device_serial}: {process.stdout.strip()[:100]}")
+        return None
+    return digest
+
+
+def diff_inventory(old, new):
+    """Return the apps added and removed between two categorized inventories."""
+    diff = {'added': {}, 'removed': {}}
+    for category in ('external', 'system'):
+        old_apps = {(app['package_name'], app['apk_path']): app for app in old.get(category, [])}
+        new_apps = {(app['package_name'], app['apk_path']): app for app in new.get(category, [])}
+        diff['added'][category] = [app for key, app in new_apps.items() if key not in old_apps]
+        diff['removed'][category] = [app for key, app in old_apps.items() if key not in new_apps]
+    return diff
+
+
+def is_empty_diff(diff):
+    return not any(diff['added'].values()) and not any(diff['removed'].values())
+
+
+def apply_inventory_diff(inventory, diff):
+    """
+    Return a new categorized inventory with a diff from diff_inventory applied.
+    Idempotent: an app that is already present is not added a second time.
+    """
+    result = {}
+    for category in ('external', 'system'):
+        removed = {(app['package_name'], app['apk_path']) for app in diff['removed'].get(category, [])}
+        apps = [app for app in inventory.get(category, [])
+                if (app['package_name'], app['apk_path']) not in removed]
+        present = {(app['package_name'], app['apk_path']) for app in apps}
+        for app in diff['added'].get(category, []):
+            key = (app['package_name'], app['apk_path'])
+            if key not in present:
+                present.add(key)
+                apps.append(app)
+        result[category] = apps
+    return result
@@ -0,0 +1,746 @@
+"""
+Background daemon that owns device discovery, inventory caches and the job queue.
+
+Clients (the GUI, scripts, ...) talk to it with newline-delimited JSON-RPC 2.0
+over localhost TCP, or over a Unix socket where the platform supports one.
+The first request on a connection must be `authenticate` with the token from
+the user-only token file; anything else (or a line that isn't JSON) closes it.
+Run it standalone with `python daemon.py`; if none is running, the GUI starts
+one as a detached process so it outlives the window that started it.
+"""
+import argparse
+import hmac
+import inspect
+import itertools
+import json
+import os
+import queue
+import secrets
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import adb_utils
+import tcp_devices
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 5039  # adb's own server listens on 5037
+# Written with mode 0600 on every daemon start; clients must send it in 'authenticate' first
+DEFAULT_TOKEN_FILE = os.path.join(os.path.expanduser("~"), ".adb_app_manager_daemon_token")
+DEVICE_POLL_INTERVAL = 10  # seconds between background 'adb devices' polls
+WATCH_INTERVAL = 5  # seconds between package-list digest checks on watched devices
+MAX_PARALLEL_WATCH_CHECKS = 8  # watched devices checked at once, so one slow device doesn't hold up the rest
+DAEMON_START_TIMEOUT = 5  # seconds to wait for a freshly spawned daemon to accept connections
+
+# Events a client can subscribe to; each is pushed as a JSON-RPC notification
+EVENTS = ("devices_changed", "inventory_changed", "job_started", "job_finished", "endpoints_changed")
+JOB_ACTIONS = ("uninstall",)
+
+# JSON-RPC 2.0 error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+ADB_ERROR = -32000
+AUTH_ERROR = -32001
+
+
+class DaemonError(Exception):
+    """Raised by DaemonClient when a call fails or the daemon goes away."""
+
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.code = code
+
+
+class DeviceSession:
+    """Per-device state: a lock serialising adb calls, the cached inventory and its on-device digest."""
+
+    def __init__(self, serial):
+        self.serial = serial
+        self.lock = threading.Lock()
+        self.inventory = None
+        self.digest = None  # on-device digest the inventory was fetched under, None if unknown
+        self.version = 0  # bumped whenever the inventory changes, so clients can tell if a diff applies
+
+
+class _RpcHandler(socketserver.StreamRequestHandler):
+    """One connected client: reads requests line by line and sends replies/notifications."""
+
+    def setup(self):
+        super().setup()
+        self.write_lock = threading.Lock()
+        self.events = set()
+        self.watched = set()
+        self.authenticated = False
+        self.close_requested = False
+        self.server.debloater_daemon.add_client(self)
+
+    def handle(self):
+        for raw_line in self.rfile:
+            line = raw_line.strip()
+            if not line:
+                continue
+            response = self.server.debloater_daemon.handle_message(self, line)
+            if response is not None:
+                self.send(response)
+            if self.close_requested:
+                # Garbage or an unauthenticated request: this isn't one of our clients (e.g. a browser POST)
+                break
+
+    def finish(self):
+        self.server.debloater_daemon.remove_client(self)
+        try:
+            super().finish()
+        except OSError:
+            pass
+
+    def send(self, message):
+        data = (json.dumps(message) + "\n").encode("utf-8")
+        with self.write_lock:
+            try:
+                self.wfile.write(data)
+                self.wfile.flush()
+            except OSError as e:
+                print(f"[DEBUG_DAEMON] Could not send to client: {e}")
+
+
+class _TcpServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    # On Windows SO_REUSEADDR lets a second daemon bind the same port, so only use it elsewhere
+    allow_reuse_address = sys.platform != "win32"
+
+
+if hasattr(socketserver, "ThreadingUnixStreamServer"):
+    class _UnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+else:
+    _UnixServer = None
+
+
+def _write_token_file(path, token):
+    """Write the auth token readable by the current user only."""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(token)
+    os.chmod(path, 0o600)  # O_CREAT's mode doesn't apply to an existing file
+
+
+def _error_response(request_id, code, message):
+    return {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}}
+
+
+class DebloaterDaemon:
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_socket_path=None, token_file=DEFAULT_TOKEN_FILE,
+                 adb_path=None, poll_interval=DEVICE_POLL_INTERVAL, watch_interval=WATCH_INTERVAL,
+                 endpoints_file=tcp_devices.DEFAULT_ENDPOINTS_FILE):
+        self.host = host
+        self.port = port
+        self.unix_socket_path = unix_socket_path
+        self.token_file = token_file
+        self._token = secrets.token_hex(32)
+        self.adb_path = adb_path if adb_path else adb_utils.get_tool_path("adb")
+        self.poll_interval = poll_interval
+        self.watch_interval = watch_interval
+        self.address = None
+
+        self._devices = None  # serials in the 'device' state; None until the first successful 'adb devices'
+        self._device_states = {}  # every transport adb lists -> its state (device, offline, unauthorized, ...)
+        self._sessions = {}
+        self._state_lock = threading.Lock()
+        self._discovery_lock = threading.Lock()
+        self._clients = set()
+        self._clients_lock = threading.Lock()
+        self._watch_executor = ThreadPoolExecutor(max_workers=MAX_PARALLEL_WATCH_CHECKS, thread_name_prefix="watch")
+        self._watch_checks = set()  # serials whose watch check is still running
+        self._jobs = queue.Queue()
+        self._job_ids = itertools.count(1)
+        self._stop_event = threading.Event()
+        self._server = None
+        self.tcp_manager = tcp_devices.ConnectionManager(
+            self.adb_path, endpoints_file=endpoints_file,
+            on_change=lambda endpoints: self.notify("endpoints_changed", {"endpoints": endpoints}),
+            on_transport_change=self._on_tcp_transport_change)
+
+        self._methods = {
+            "ping": self.rpc_ping,
+            "list_devices": self.rpc_list_devices,
+            "list_packages": self.rpc_list_packages,
+            "execute": self.rpc_execute,
+            "subscribe": self.rpc_subscribe,
+            "unsubscribe": self.rpc_unsubscribe,
+            "watch": self.rpc_watch,
+            "unwatch": self.rpc_unwatch,
+            "transfer_stats": self.rpc_transfer_stats,
+            "list_endpoints": self.rpc_list_endpoints,
+            "add_endpoint": self.rpc_add_endpoint,
+            "remove_endpoint": self.rpc_remove_endpoint,
+            "reconnect_endpoints": self.rpc_reconnect_endpoints,
+        }
+
+    # --- Lifecycle ---
+    def start(self):
+        """Bind the socket and start the server, device poller, watcher, TCP manager and job worker threads."""
+        if self.unix_socket_path:
+            if _UnixServer is None:
+                raise OSError("Unix sockets are not supported on this platform.")
+            server = _UnixServer(self.unix_socket_path, _RpcHandler)
+            os.chmod(self.unix_socket_path, 0o600)
+        else:
+            server = _TcpServer((self.host, self.port), _RpcHandler)
+        # Only publish the token once the address is ours, so a losing racer can't overwrite it
+        try:
+            _write_token_file(self.token_file, self._token)
+        except OSError:
+            server.server_close()
+            raise
+        server.debloater_daemon = self
+        self._server = server
+        self.address = server.server_address
+        print(f"[DEBUG_DAEMON] Listening on {self.address}")
+
+        for target in (server.serve_forever, self._poll_devices_loop, self._watch_loop, self._tcp_loop,
+                       self._job_worker):
+            thread = threading.Thread(target=target)
+            thread.daemon = True
+            thread.start()
+
+    def serve_forever(self):
+        self.start()
+        try:
+            self._stop_event.wait()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self):
+        self._stop_event.set()
+        self._jobs.put(None)
+        self._watch_executor.shutdown(wait=False)
+        self.tcp_manager.shutdown()
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            with self._clients_lock:
+                clients = list(self._clients)
+            for client in clients:
+                try:
+                    client.connection.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            if self.unix_socket_path and os.path.exists(self.unix_socket_path):
+                os.remove(self.unix_socket_path)
+            self._server = None
+
+    # --- Clients and notifications ---
+    def add_client(self, client):
+        with self._clients_lock:
+            self._clients.add(client)
+
+    def remove_client(self, client):
+        with self._clients_lock:
+            self._clients.discard(client)
+
+    def notify(self, event, params, exclude=None):
+        with self._clients_lock:
+            targets = [client for client in self._clients if event in client.events and client is not exclude]
+        message = {"jsonrpc": "2.0", "method": event, "params": params}
+        for client in targets:
+            client.send(message)
+
+    def handle_message(self, client, line):
+        """Dispatch one JSON-RPC request line and return the response dict (None for notifications)."""
+        try:
+            message = json.loads(line)
+        except ValueError:
+            client.close_requested = True
+            return _error_response(None, PARSE_ERROR, "Parse error")
+
+        if not isinstance(message, dict) or not isinstance(message.get("method"), str):
+            client.close_requested = True
+            request_id = message.get("id") if isinstance(message, dict) else None
+            return _error_response(request_id, INVALID_REQUEST, "Invalid request")
+
+        request_id = message.get("id")
+        params = message.get("params") or {}
+        if not client.authenticated:
+            token = params.get("token") if isinstance(params, dict) else None
+            if message["method"] != "authenticate" or not isinstance(token, str) or \
+                    not hmac.compare_digest(token.encode("utf-8"), self._token.encode("utf-8")):
+                client.close_requested = True
+                return _error_response(request_id, AUTH_ERROR, "Authentication required.")
+            client.authenticated = True
+            return {"jsonrpc": "2.0", "id": request_id, "result": "ok"}
+        method = self._methods.get(message["method"])
+        if method is None:
+            return _error_response(request_id, METHOD_NOT_FOUND, f"Method not found: {message['method']}")
+        if not isinstance(params, dict):
+            return _error_response(request_id, INVALID_PARAMS, "Params must be an object.")
+
+        try:
+            inspect.signature(method).bind(client, **params)
+        except TypeError as e:
+            return _error_response(request_id, INVALID_PARAMS, str(e))
+
+        try:
+            result = method(client, **params)
+        except adb_utils.AdbError as e:
+            return _error_response(request_id, ADB_ERROR, str(e))
+        except ValueError as e:
+            return _error_response(request_id, INVALID_PARAMS, str(e))
+        except Exception as e:
+            print(f"[ERROR] Unexpected error in daemon method {message['method']}: {e}")
+            return _error_response(request_id, ADB_ERROR, f"Unexpected error: {e}")
+
+        if request_id is None:
+            return None
+        return {"jsonrpc": "2.0", "id": request_id, "result": result}
+
+    # --- Device state ---
+    def _get_session(self, serial):
+        with self._state_lock:
+            session = self._sessions.get(serial)
+            if session is None:
+                session = DeviceSession(serial)
+                self._sessions[serial] = session
+            return session
+
+    def _refresh_devices(self):
+        # Only one 'adb devices' at a time, however many clients ask
+        with self._discovery_lock:
+            states = adb_utils.get_adb_device_states(self.adb_path)
+            devices = [serial for serial, state in states.items() if state == "device"]
+            with self._state_lock:
+                changed = devices != self._devices or states != self._device_states
+                self._devices = devices
+                self._device_states = states
+                for serial in list(self._sessions):
+                    if serial not in devices:
+                        del self._sessions[serial]
+        if changed:
+            self.notify("devices_changed", {"devices": devices, "states": states})
+        return devices, states
+
+    def _poll_devices_loop(self):
+        while not self._stop_event.is_set():
+            try:
+                self._refresh_devices()
+            except adb_utils.AdbError as e:
+                print(f"[DEBUG_DAEMON] Device poll failed: {e}")
+            except Exception as e:
+                print(f"[ERROR] Unexpected error polling devices: {e}")
+            self._stop_event.wait(self.poll_interval)
+
+    def _store_inventory(self, session, inventory, digest):
+        """
+        Replace a session's inventory and digest (caller holds session.lock).
+        Returns inventory_changed params with the diff from the previous version, or None if nothing changed.
+        """
+        previous = session.inventory
+        session.inventory = inventory
+        session.digest = digest
+        if previous is None:
+            session.version += 1
+            return None
+        diff = adb_utils.diff_inventory(previous, inventory)
+        if adb_utils.is_empty_diff(diff):
+            return None
+        session.version += 1
+        return {"serial": session.serial, "diff": diff, "base_version": session.version - 1,
+                "version": session.version}
+
+    def _watched_serials(self):
+        with self._clients_lock:
+            watched = set()
+            for client in self._clients:
+                watched.update(client.watched)
+        with self._state_lock:
+            devices = self._devices or []
+        return [serial for serial in devices if serial in watched]
+
+    def _check_watched_device(self, serial):
+        session = self._get_session(serial)
+        with session.lock:
+            digest = adb_utils.get_package_list_digest(self.adb_path, serial)
+            if digest is not None and digest == session.digest and session.inventory is not None:
+                return
+            # Digest changed (or md5sum is unavailable): only now pull the full list
+            change = self._store_inventory(session, adb_utils.get_installed_apps(self.adb_path, serial), digest)
+        if change:
+            self.notify("inventory_changed", change)
+
+    def _run_watch_check(self, serial):
+        try:
+            self._check_watched_device(serial)
+        except adb_utils.AdbError as e:
+            print(f"[DEBUG_DAEMON] Watch check failed for {serial}: {e}")
+        except Exception as e:
+            print(f"[ERROR] Unexpected error checking watched device {serial}: {e}")
+        finally:
+            with self._state_lock:
+                self._watch_checks.discard(serial)
+
+    def _watch_loop(self):
+        while not self._stop_event.wait(self.watch_interval):
+            try:
+                for serial in self._watched_serials():
+                    with self._state_lock:
+                        if serial in self._watch_checks:
+                            continue  # last tick's check is still running, don't pile up another
+                        self._watch_checks.add(serial)
+                    try:
+                        self._watch_executor.submit(self._run_watch_check, serial)
+                    except RuntimeError:
+                        # stop() shut the pool down mid-tick
+                        with self._state_lock:
+                            self._watch_checks.discard(serial)
+                        return
+            except Exception as e:
+                print(f"[ERROR] Unexpected error in watch loop: {e}")
+
+    def _tcp_loop(self):
+        while not self._stop_event.is_set():
+            try:
+                self.tcp_manager.tick()
+            except Exception as e:
+                print(f"[ERROR] Unexpected error ticking TCP endpoints: {e}")
+            self._stop_event.wait(1)
+
+    def _on_tcp_transport_change(self, address, status):
+        # Don't wait for the next poll to show or hide a TCP device
+        try:
+            self._refresh_devices()
+        except adb_utils.AdbError as e:
+            print(f"[DEBUG_DAEMON] Device refresh after {address} changed failed: {e}")
+
+    def _job_worker(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            self.notify("job_started", dict(job))
+            try:
+                session = self._get_session(job["serial"])
+                with session.lock:
+                    try:
+                        success, message = adb_utils.uninstall_package(self.adb_path, job["serial"], job["package"])
+                    except adb_utils.AdbError as e:
+                        success, message = False, f"Error deleting {job['package']}: {e}"
+                    if success:
+                        # Drop the cache; the next list_packages call refetches it once for everyone
+                        session.inventory = None
+                        session.digest = None
+            except Exception as e:
+                # One bad job must not kill the only worker, every later job would sit in the queue forever
+                print(f"[ERROR] Unexpected error running job {job['job_id']}: {e}")
+                success, message = False, f"Unexpected error deleting {job['package']}: {e}"
+            self.notify("job_finished", dict(job, success=success, message=message))
+            if success:
+                self.notify("inventory_changed", {"serial": job["serial"]})
+
+    # --- RPC methods ---
+    def rpc_ping(self, client):
+        return "pong"
+
+    def rpc_transfer_stats(self, client):
+        """Bytes streamed from devices so far and how many of them compression saved."""
+        return adb_utils.get_transfer_totals()
+
+    def rpc_list_endpoints(self, client):
+        return {"endpoints": self.tcp_manager.list_endpoints()}
+
+    def rpc_add_endpoint(self, client, address):
+        return {"address": self.tcp_manager.add_endpoint(address)}
+
+    def rpc_remove_endpoint(self, client, address):
+        return {"removed": self.tcp_manager.remove_endpoint(address)}
+
+    def rpc_reconnect_endpoints(self, client, address=None):
+        self.tcp_manager.reconnect(address)
+        return {"endpoints": self.tcp_manager.list_endpoints()}
+
+    def rpc_list_devices(self, client, refresh=False):
+        """Usable devices, plus the state of every transport adb lists so offline/unauthorized ones aren't hidden."""
+        with self._state_lock:
+            devices, states = self._devices, self._device_states
+        if refresh or devices is None:
+            devices, states = self._refresh_devices()
+        return {"devices": list(devices), "states": dict(states)}
+
+    def rpc_list_packages(self, client, serial, refresh=False):
+        """Return the (cached) inventory of a device, tagged with its version."""
+        session = self._get_session(serial)
+        watched = serial in self._watched_serials()
+        change = None
+        with session.lock:
+            if refresh or session.inventory is None:
+                # Take the digest before the listing so the next watch tick doesn't refetch an unchanged list;
+                # if the list changes in between, the digest no longer matches and the tick catches up
+                digest = adb_utils.get_package_list_digest(self.adb_path, serial) if watched else None
+                change = self._store_inventory(session, adb_utils.get_installed_apps(self.adb_path, serial), digest)
+            inventory = dict(session.inventory, version=session.version)
+        if change:
+            # The caller gets the new inventory in the response; a diff on top of it would be applied twice
+            self.notify("inventory_changed", change, exclude=client)
+        return inventory
+
+    def rpc_execute(self, client, serial, action, package):
+        if action not in JOB_ACTIONS:
+            raise ValueError(f"Unknown action: {action}")
+        for name, value in (("serial", serial), ("package", package)):
+            if not isinstance(value, str) or not value:
+                raise ValueError(f"'{name}' must be a non-empty string.")
+        job = {"job_id": next(self._job_ids), "serial": serial, "action": action, "package": package}
+        self._jobs.put(job)
+        return {"job_id": job["job_id"]}
+
+    def rpc_subscribe(self, client, events=None):
+        events = list(EVENTS) if events is None else events
+        unknown = [event for event in events if event not in EVENTS]
+        if unknown:
+            raise ValueError(f"Unknown events: {', '.join(map(str, unknown))}")
+        client.events.update(events)
+        return {"events": sorted(client.events)}
+
+    def rpc_unsubscribe(self, client, events=None):
+        if events is None:
+            client.events.clear()
+        else:
+            client.events.difference_update(events)
+        return {"events": sorted(client.events)}
+
+    def rpc_watch(self, client, serial):
+        """Keep a device's inventory live; changes arrive as inventory_changed events carrying a diff."""
+        client.watched.add(serial)
+        return {"watched": sorted(client.watched)}
+
+    def rpc_unwatch(self, client, serial=None):
+        if serial is None:
+            client.watched.clear()
+        else:
+            client.watched.discard(serial)
+        return {"watched": sorted(client.watched)}
+
+
+class DaemonClient:
+    """
+    Thin JSON-RPC client for a single connection. `call` blocks until the matching response arrives;
+    notifications are passed to on_notification(method, params) on the reader thread, and
+    on_disconnect() is called there if an authenticated connection drops without close().
+    """
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_socket_path=None, token_file=DEFAULT_TOKEN_FILE,
+                 on_notification=None, on_disconnect=None, timeout=120):
+        self.host = host
+        self.port = port
+        self.unix_socket_path = unix_socket_path
+        self.token_file = token_file
+        self.on_notification = on_notification
+        self.on_disconnect = on_disconnect
+        self.timeout = timeout
+
+        self._sock = None
+        self._connected = False
+        self._authenticated = False  # only a connection that got past authenticate counts as lost when it drops
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def connect(self):
+        with open(self.token_file, "r", encoding="utf-8") as f:
+            token = f.read().strip()
+
+        if self.unix_socket_path:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.unix_socket_path)
+            except OSError:
+                sock.close()
+                raise
+        else:
+            sock = socket.create_connection((self.host, self.port), timeout=5)
+            sock.settimeout(None)
+        self._sock = sock
+        self._connected = True
+
+        reader_thread = threading.Thread(target=self._reader_loop, args=(sock.makefile("rb"),))
+        reader_thread.daemon = True
+        reader_thread.start()
+
+        try:
+            self.call("authenticate", token=token)
+        except DaemonError:
+            self.close()
+            raise
+        self._authenticated = True
+
+    def close(self):
+        self._authenticated = False
+        if self._sock:
+            try:
+                self._sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._sock.close()
+            self._sock = None
+
+    def call(self, method, **params):
+        request_id = next(self._ids)
+        waiter = {"event": threading.Event(), "response": None}
+        with self._pending_lock:
+            if not self._connected:
+                raise DaemonError("Not connected to daemon.")
+            self._pending[request_id] = waiter
+
+        data = (json.dumps({"jsonrpc": "2.0", "id": request_id, "method": method, "params": params}) + "\n")
+        try:
+            with self._write_lock:
+                self._sock.sendall(data.encode("utf-8"))
+        except OSError as e:
+            with self._pending_lock:
+                self._pending.pop(request_id, None)
+            raise DaemonError(f"Connection to daemon lost: {e}")
+
+        if not waiter["event"].wait(self.timeout):
+            with self._pending_lock:
+                self._pending.pop(request_id, None)
+            raise DaemonError(f"Daemon call '{method}' timed out.")
+
+        response = waiter["response"]
+        if response is None:
+            raise DaemonError("Connection to daemon lost.")
+        if "error" in response:
+            raise DaemonError(response["error"].get("message", "Unknown error."), response["error"].get("code"))
+        return response.get("result")
+
+    def subscribe(self, events=None):
+        if events is None:
+            return self.call("subscribe")
+        return self.call("subscribe", events=list(events))
+
+    def _reader_loop(self, rfile):
+        try:
+            for raw_line in rfile:
+                try:
+                    message = json.loads(raw_line)
+                except ValueError:
+                    print(f"[DEBUG] Ignoring malformed daemon message: {raw_line[:100]!r}")
+                    continue
+
+                if "id" in message and message["id"] is not None:
+                    with self._pending_lock:
+                        waiter = self._pending.pop(message["id"], None)
+                    if waiter:
+                        waiter["response"] = message
+                        waiter["event"].set()
+                elif "method" in message and self.on_notification:
+                    self.on_notification(message["method"], message.get("params") or {})
+        except OSError:
+            pass
+        finally:
+            # Wake up everyone still waiting; call() turns a None response into DaemonError
+            with self._pending_lock:
+                self._connected = False
+                waiters = list(self._pending.values())
+                self._pending.clear()
+            for waiter in waiters:
+                waiter["event"].set()
+            if self._authenticated and self.on_disconnect:
+                self.on_disconnect()
+
+
+def spawn_daemon(host=DEFAULT_HOST, port=DEFAULT_PORT, unix_socket_path=None, token_file=DEFAULT_TOKEN_FILE):
+    """
+    Start `python daemon.py` as a detached process, so its lifetime isn't tied to the client that started it.
+    Returns the Popen, or None in a frozen (PyInstaller) build where there is no daemon.py to run.
+    """
+    if getattr(sys, "frozen", False):
+        return None
+    args = [sys.executable, os.path.abspath(__file__), "--host", host, "--port", str(port), "--token-file", token_file]
+    if unix_socket_path:
+        args += ["--unix-socket", unix_socket_path]
+    if sys.platform == "win32":
+        detach = {"creationflags": subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP}
+    else:
+        detach = {"start_new_session": True}
+    return subprocess.Popen(args, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                            close_fds=True, **detach)
+
+
+def ensure_daemon(on_notification=None, on_disconnect=None, host=DEFAULT_HOST, port=DEFAULT_PORT,
+                  unix_socket_path=None, token_file=DEFAULT_TOKEN_FILE, detach=True):
+    """
+    Connect to a running daemon, starting one if none is listening: a detached `daemon.py` process
+    when detach is set and possible, else one in this process.
+    Returns (client, local_daemon); local_daemon is None unless the daemon runs in this process.
+    """
+    def new_client():
+        return DaemonClient(host=host, port=port, unix_socket_path=unix_socket_path, token_file=token_file,
+                            on_notification=on_notification, on_disconnect=on_disconnect)
+
+    client = new_client()
+    try:
+        client.connect()
+        print("[DEBUG] Connected to running daemon.")
+        return client, None
+    except (OSError, DaemonError) as e:
+        print(f"[DEBUG] No daemon running ({e}), starting one...")
+
+    if unix_socket_path and os.path.exists(unix_socket_path):
+        # Nobody answered, so the socket file is left over from a daemon that died
+        os.remove(unix_socket_path)
+
+    process = None
+    if detach:
+        try:
+            process = spawn_daemon(host=host, port=port, unix_socket_path=unix_socket_path, token_file=token_file)
+        except OSError as e:
+            print(f"[DEBUG] Could not spawn daemon process ({e}).")
+    if process:
+        # Until it has bound the socket and rewritten the token file, connects fail or carry a stale token
+        deadline = time.monotonic() + DAEMON_START_TIMEOUT
+        last_error = None
+        while time.monotonic() < deadline:
+            time.sleep(0.1)
+            client = new_client()
+            try:
+                client.connect()
+                print(f"[DEBUG] Started daemon process {process.pid}.")
+                return client, None
+            except (OSError, DaemonError) as e:
+                last_error = e
+        print(f"[DEBUG] Spawned daemon did not answer ({last_error}), starting one in-process.")
+
+    local_daemon = DebloaterDaemon(host=host, port=port, unix_socket_path=unix_socket_path, token_file=token_file)
+    try:
+        local_daemon.start()
+    except OSError as e:
+        # Another client started a daemon between our connect attempt and now
+        print(f"[DEBUG] Could not start daemon ({e}), connecting to the existing one.")
+        local_daemon = None
+
+    client = new_client()
+    client.connect()
+    return client, local_daemon
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ADB App Manager background daemon")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix-socket", dest="unix_socket_path", default=None,
+                        help="Listen on this Unix socket path instead of TCP.")
+    parser.add_argument("--token-file", default=DEFAULT_TOKEN_FILE,
+                        help="Where to write the token clients must authenticate with.")
+    parser.add_argument("--endpoints-file", default=tcp_devices.DEFAULT_ENDPOINTS_FILE,
+                        help="JSON file holding the managed adb-over-TCP endpoints.")
+    args = parser.parse_args()
+
+    DebloaterDaemon(host=args.host, port=args.port, unix_socket_path=args.unix_socket_path,
+                    token_file=args.token_file, endpoints_file=args.endpoints_file).serve_forever()
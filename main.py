@@ -1,29 +1,24 @@
 import customtkinter
-import subprocess
-import os
-import sys
 import threading
 import queue
 import inspect  # Import inspect to check method signatures
 
+from adb_utils import apply_inventory_diff
+from daemon import DaemonError, ensure_daemon
+
 # --- Global Queue for UI Updates from Background Threads ---
 ui_update_queue = queue.Queue()
 
+DAEMON_RECONNECT_DELAY = 2000  # ms between attempts to get a daemon back after the connection dropped
+
+
+def _app_key(app_info):
+    """Identifies an app's row; the same package can be listed under more than one APK path."""
+    return app_info['package_name'], app_info['apk_path']
 
-# --- resource_path function ---
-def resource_path(relative_path):
-    """
-    Get the absolute path to a resource, useful for PyInstaller.
-    This function expects relative_path to be a valid string, not None.
-    """
-    try:
-        # PyInstaller creates a temp folder and stores path in _MEIPASS
-        base_path = sys._MEIPASS
-    except AttributeError:
-        base_path = os.path.abspath(".")
 
-    # No longer checks for None here; the caller ensures it's not None.
-    return os.path.join(base_path, relative_path)
+def _app_sort_key(key):
+    return key[0].lower(), key[1]
 
 
 # --- CTkMessageBox Class ---
@@ -104,7 +99,7 @@ class App(customtkinter.CTk):
         # --- Control Panel Frame (Left Side) ---
         self.control_frame = customtkinter.CTkFrame(self, width=200, corner_radius=10)
         self.control_frame.grid(row=0, column=0, padx=20, pady=20, sticky="nsew")
-        self.control_frame.grid_rowconfigure(7, weight=1)  # Adjusted for new About button
+        self.control_frame.grid_rowconfigure(9, weight=1)  # Adjusted for TCP device rows
 
         # Device selection label
         self.device_label = customtkinter.CTkLabel(self.control_frame, text="Select Device:")
@@ -119,22 +114,33 @@ class App(customtkinter.CTk):
         # Refresh devices button
         self.refresh_button = customtkinter.CTkButton(self.control_frame,
                                                       text="Refresh Devices",
-                                                      command=self.populate_device_combobox)
+                                                      command=lambda: self.populate_device_combobox(refresh=True))
         self.refresh_button.grid(row=2, column=0, padx=10, pady=10, sticky="ew")
 
+        # TCP device Entry Box (wireless / network adb)
+        self.tcp_entry = customtkinter.CTkEntry(self.control_frame,
+                                                placeholder_text="TCP device host:port...")
+        self.tcp_entry.grid(row=3, column=0, padx=10, pady=(0, 5), sticky="ew")
+
+        # Add TCP device button
+        self.add_tcp_button = customtkinter.CTkButton(self.control_frame,
+                                                      text="Add TCP Device",
+                                                      command=self.add_tcp_endpoint)
+        self.add_tcp_button.grid(row=4, column=0, padx=10, pady=(0, 10), sticky="ew")
+
         # Search label
         self.search_label = customtkinter.CTkLabel(self.control_frame, text="Search Package:")
-        self.search_label.grid(row=3, column=0, padx=10, pady=(10, 0), sticky="w")
+        self.search_label.grid(row=5, column=0, padx=10, pady=(10, 0), sticky="w")
 
         # Search Entry Box
         self.search_entry = customtkinter.CTkEntry(self.control_frame,
                                                    placeholder_text="Enter package name or part...")
-        self.search_entry.grid(row=4, column=0, padx=10, pady=(0, 10), sticky="ew")
+        self.search_entry.grid(row=6, column=0, padx=10, pady=(0, 10), sticky="ew")
         self.search_entry.bind("<KeyRelease>", self.on_search_change)
 
         # Status label for operations like deletion
         self.status_label = customtkinter.CTkLabel(self.control_frame, text="", text_color="green", wraplength=180)
-        self.status_label.grid(row=5, column=0, padx=10, pady=(0, 10), sticky="ew")
+        self.status_label.grid(row=7, column=0, padx=10, pady=(0, 10), sticky="ew")
 
         # --- About Me Button ---
         self.about_button = customtkinter.CTkButton(
@@ -142,7 +148,7 @@ class App(customtkinter.CTk):
             text="About This App",
             command=self.about_me
         )
-        self.about_button.grid(row=6, column=0, padx=10, pady=10, sticky="ew")
+        self.about_button.grid(row=8, column=0, padx=10, pady=10, sticky="ew")
 
         # --- App Display Container (Right Side) ---
         self.app_display_container = customtkinter.CTkFrame(self, corner_radius=10)
@@ -174,33 +180,74 @@ class App(customtkinter.CTk):
         self.system_apps_scroll_frame.grid_columnconfigure(1, weight=0)
 
         self.all_apps_categorized = {'external': [], 'system': []}
+        # Rows on screen per category: (package_name, apk_path) -> {"frame": ..., "index": ...},
+        # so a watch diff only touches the rows it adds or removes
+        self.app_rows = {'external': {}, 'system': {}}
+        self.empty_list_labels = {'external': None, 'system': None}
+        self.displayed_search_query = None  # search the rows were built for; None while a message is shown
+        self.device_serials = []
+        self.device_states = {}  # every transport adb lists -> its state (device, offline, unauthorized, ...)
+        self.tcp_endpoints = []
+        self.transport_labels = {}  # device picker entry -> (address, state), for transports that can't be used
 
         # --- Initial Setup ---
-        # Get the potential path to ADB
-        adb_raw_path = self.get_tool_path("adb")
-
-        # Now, handle if ADB was found or not
-        if adb_raw_path:
-            try:
-                # If a path was found, then resolve it using resource_path
-                self.adb_path = resource_path(adb_raw_path)
-                print(f"[DEBUG] Final ADB path set to: {self.adb_path}")
-            except Exception as e:  # Catch any error during resource_path conversion
-                self.adb_path = None
-                self.status_label.configure(text_color="red", text=f"Error: ADB path invalid. {e}")
-                print(f"[ERROR] Could not set ADB path after resource_path: {e}")
-        else:
-            # If get_tool_path already returned None, ADB was not found.
-            self.adb_path = None
-            self.status_label.configure(text_color="red", text="Error: ADB not found. Check console.")
-            print("\n!!! CRITICAL ERROR: ADB executable not found. !!!")
-            print(
-                "Please ensure ADB is installed and configured correctly (either in a 'adb' subfolder next to your script, or in your system's PATH).")
+        # Device discovery, inventories and uninstall jobs live in the daemon (daemon.py);
+        # the GUI only talks to it, so several clients can share one set of adb calls.
+        self.daemon_client = None
+        self.local_daemon = None
+        self.watched_serial = None
+        self._connect_daemon()
 
         self.populate_device_combobox()
-        self.after(10000, self.populate_device_combobox)
         self.after(100, self.process_ui_queue)
 
+    def _connect_daemon(self):
+        """Connect to the daemon (starting one if none is running) and subscribe. Returns False on failure."""
+        client = None
+        try:
+            client, local_daemon = ensure_daemon(on_notification=self.on_daemon_notification,
+                                                 on_disconnect=self.on_daemon_disconnect)
+            client.subscribe()
+            self.tcp_endpoints = client.call("list_endpoints")["endpoints"]
+        except (OSError, DaemonError) as e:
+            if client:
+                client.close()
+            self.daemon_client = None
+            self.status_label.configure(text_color="red", text=f"Error: could not reach daemon. {e}")
+            print(f"[ERROR] Could not connect to or start the daemon: {e}")
+            return False
+
+        self.daemon_client = client
+        if local_daemon:
+            self.local_daemon = local_daemon
+        # Watches belong to the connection, so a new one starts out watching nothing
+        self.watched_serial = None
+        return True
+
+    def _reconnect_daemon(self):
+        if self._connect_daemon():
+            print("[DEBUG] Reconnected to daemon.")
+            self.populate_device_combobox()  # re-watches and refetches the selected device
+        else:
+            self.after(DAEMON_RECONNECT_DELAY, self._reconnect_daemon)
+
+    def on_daemon_disconnect(self):
+        """Called on the daemon client's reader thread when the daemon goes away (e.g. the GUI hosting it closed)."""
+        ui_update_queue.put({"type": "daemon_lost"})
+
+    def on_daemon_notification(self, event, params):
+        """Called on the daemon client's reader thread; hands events over to the UI thread."""
+        if event == "devices_changed":
+            ui_update_queue.put({"type": "refresh_devices"})
+        elif event == "inventory_changed":
+            ui_update_queue.put({"type": "refresh_apps", "serial": params.get("serial"), "diff": params.get("diff"),
+                                 "base_version": params.get("base_version"), "version": params.get("version")})
+        elif event == "endpoints_changed":
+            ui_update_queue.put({"type": "refresh_endpoints", "endpoints": params["endpoints"]})
+        elif event == "job_finished":
+            ui_update_queue.put(
+                {"type": "status", "text": params["message"], "color": "green" if params["success"] else "red"})
+
     def process_ui_queue(self):
         try:
             while True:
@@ -209,141 +256,165 @@ class App(customtkinter.CTk):
                     self.status_label.configure(text_color=message["color"], text=message["text"])
                 elif message["type"] == "refresh_apps":
                     selected_device = self.device_combobox.get()
-                    if selected_device and selected_device != "No devices found":
-                        self._fetch_and_display_apps(selected_device)
+                    if selected_device and selected_device != "No devices found" and \
+                            message.get("serial") in (None, selected_device):
+                        current_version = self.all_apps_categorized.get("version")
+                        if message.get("diff") and message["base_version"] == current_version:
+                            # Watched device changed: patch the list in place instead of refetching it
+                            self.all_apps_categorized = apply_inventory_diff(self.all_apps_categorized,
+                                                                             message["diff"])
+                            self.all_apps_categorized["version"] = message["version"]
+                            self._apply_diff_to_displayed_apps(message["diff"])
+                        elif message.get("diff") and current_version is not None and \
+                                message["version"] <= current_version:
+                            pass  # a fetch already brought us this version or a newer one
+                        else:
+                            self._fetch_and_display_apps(selected_device)
+                elif message["type"] == "refresh_devices":
+                    self.populate_device_combobox()
+                elif message["type"] == "refresh_endpoints":
+                    self.tcp_endpoints = message["endpoints"]
+                    self._update_device_picker_values()
+                elif message["type"] == "daemon_lost":
+                    self.daemon_client = None
+                    self.status_label.configure(text_color="orange", text="Lost connection to daemon, reconnecting...")
+                    self._reconnect_daemon()
                 ui_update_queue.task_done()
         except queue.Empty:
             pass
         self.after(100, self.process_ui_queue)
 
-    def get_tool_path(self, tool_name):
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        final_tool_path = None
-        exe_name = f"{tool_name}.exe" if sys.platform == "win32" else tool_name
-
-        candidate_path_specific_folder = os.path.join(script_dir, tool_name, exe_name)
-        if os.path.exists(candidate_path_specific_folder) and os.path.isfile(candidate_path_specific_folder):
-            final_tool_path = candidate_path_specific_folder
-            print(f"[DEBUG] Trying: {final_tool_path}")
-
-        if final_tool_path is None:
-            print(f"[DEBUG] {tool_name} not found in specific folder. Checking system PATH...")
-            try:
-                check_cmd = ['where', tool_name] if sys.platform == "win32" else ['which', tool_name]
-                result = subprocess.run(check_cmd, capture_output=True, text=True, check=False, timeout=5)
-                if result.returncode == 0:
-                    final_tool_path = result.stdout.strip()
-                    print(f"[DEBUG] Found {tool_name} at: {final_tool_path} (in system PATH)")
-                else:
-                    print(f"[DEBUG] 'where'/'which' command failed for {tool_name}. Stderr: {result.stderr.strip()}")
-            except (subprocess.CalledProcessError, FileNotFoundError, subprocess.TimeoutExpired) as e:
-                print(f"[DEBUG] Error trying 'where'/'which' for {tool_name}: {e}")
-
-        if final_tool_path:
-            try:
-                print(f"[DEBUG] Verifying executability of {final_tool_path}...")
-                test_cmd = [final_tool_path]
-                if tool_name == "adb":
-                    test_cmd.append("version")
-
-                process = subprocess.Popen(test_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                stdout, stderr = process.communicate(timeout=5)
-
-                print(f"[DEBUG] {tool_name} test command stdout: {stdout.decode().strip()}")
-                print(f"[DEBUG] {tool_name} test command stderr: {stderr.decode().strip()}")
-                print(f"[DEBUG] {tool_name} test command return code: {process.returncode}")
-
-                if process.returncode != 0 and \
-                        not (b"version" in stdout.lower() or b"usage" in stdout.lower() or b"usage" in stderr.lower()):
-                    print(
-                        f"Warning: {tool_name} found at {final_tool_path} but failed initial execution test. It might not be truly executable or compatible.")
-                    final_tool_path = None
-
-            except (FileNotFoundError, subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
-                print(f"Warning: {tool_name} found at {final_tool_path} but failed to execute test command: {e}")
-                final_tool_path = None
-
-        if not final_tool_path:
-            print(f"!!! {tool_name} not found or not executable. !!!")
-            print(f"Please ensure {tool_name} is correctly installed and accessible.")
-
-        return final_tool_path
-
-    def get_adb_devices(self):
-        if not self.adb_path:
-            print("[DEBUG] ADB path is None, cannot get devices.")
+    def get_adb_devices(self, refresh=False):
+        if not self.daemon_client:
+            print("[DEBUG] No daemon connection, cannot get devices.")
             return {}
 
-        devices = {}
-        # Use self.adb_path directly as it's now guaranteed to be a string or None
-        adb_command = [self.adb_path, "devices"]
-        print(f"[DEBUG] Running ADB command: {' '.join(adb_command)}")
         try:
-            process = subprocess.run(adb_command, capture_output=True, text=True, check=False, timeout=10)
-
-            print(f"[DEBUG] ADB devices stdout:\n{process.stdout.strip()}")
-            print(f"[DEBUG] ADB devices stderr:\n{process.stderr.strip()}")
-            print(f"[DEBUG] ADB devices return code: {process.returncode}")
-
-            if process.returncode != 0:
-                print(f"Error executing 'adb devices': {process.stderr.strip()}")
-                self.status_label.configure(text_color="red", text=f"ADB error: {process.stderr.strip()[:100]}...")
-                return {}
-
-            lines = process.stdout.strip().split('\n')
-            if len(lines) > 1:
-                for line in lines[1:]:
-                    if "\tdevice" in line:
-                        serial = line.split('\t')[0].strip()
-                        devices[serial] = serial
-
-            if not devices:
-                print("[DEBUG] No devices found after parsing ADB output.")
-                self.status_label.configure(text_color="orange", text="No ADB devices connected. Connect a device.")
-            else:
-                print(f"[DEBUG] Found devices: {list(devices.keys())}")
-                self.status_label.configure(text_color="green", text="Devices detected!")
-
-            return devices
-        except (subprocess.TimeoutExpired) as e:
-            print(f"ADB command 'devices' timed out: {e}")
-            self.status_label.configure(text_color="red", text="ADB devices command timed out.")
-            return {}
-        except Exception as e:
-            print(f"An unexpected error occurred while getting ADB devices: {e}")
-            self.status_label.configure(text_color="red", text=f"Error getting devices: {e}")
+            result = self.daemon_client.call("list_devices", refresh=refresh)
+        except DaemonError as e:
+            print(f"An error occurred while getting ADB devices: {e}")
+            self.status_label.configure(text_color="red", text=str(e))
             return {}
 
-    def populate_device_combobox(self):
-        devices = self.get_adb_devices()
+        device_serials = result["devices"]
+        self.device_states = result.get("states", {})
+
+        devices = {serial: serial for serial in device_serials}
+        if not devices:
+            print("[DEBUG] No devices found after parsing ADB output.")
+            self.status_label.configure(text_color="orange", text="No ADB devices connected. Connect a device.")
+        else:
+            print(f"[DEBUG] Found devices: {list(devices.keys())}")
+            self.status_label.configure(text_color="green", text="Devices detected!")
+
+        return devices
+
+    def _update_device_picker_values(self):
+        """
+        List usable devices, then every other transport with its state: adb's own state
+        (offline, unauthorized, ...) where adb lists it, else the TCP manager's status.
+        """
+        self.transport_labels = {}
+        for serial, state in self.device_states.items():
+            if serial not in self.device_serials:
+                self.transport_labels[f"{serial} ({state})"] = (serial, state)
+        for endpoint in self.tcp_endpoints:
+            address = endpoint["address"]
+            if address in self.device_serials or address in self.device_states:
+                continue
+            # Not listed by adb, so whatever the manager last saw, it isn't usable right now
+            state = "offline" if endpoint["status"] == "connected" else endpoint["status"]
+            self.transport_labels[f"{address} ({state})"] = (address, state)
+        self.device_combobox.configure(values=self.device_serials + list(self.transport_labels))
+
+    def populate_device_combobox(self, refresh=False):
+        devices = self.get_adb_devices(refresh=refresh)
         device_serials = list(devices.keys())
-        self.device_combobox.configure(values=device_serials)
+        self.device_serials = device_serials
+        self._update_device_picker_values()
 
         if device_serials:
             current_selection = self.device_combobox.get()
             if not current_selection or current_selection not in device_serials:
                 self.device_combobox.set(device_serials[0])
-            self.on_device_selected(self.device_combobox.get())
+            self.on_device_selected(self.device_combobox.get(), refresh=refresh)
         else:
             self.device_combobox.set("No devices found")
             self._clear_and_display_message_in_frames("Please connect an ADB device to list applications.")
 
-    def on_device_selected(self, selected_device_serial):
-        if selected_device_serial and selected_device_serial != "No devices found":
-            self._fetch_and_display_apps(selected_device_serial)
+    def on_device_selected(self, selected_device_serial, refresh=False):
+        if selected_device_serial in self.transport_labels:
+            self._select_unavailable_transport(*self.transport_labels[selected_device_serial])
+        elif selected_device_serial and selected_device_serial != "No devices found":
+            self._watch_device(selected_device_serial)
+            self._fetch_and_display_apps(selected_device_serial, refresh=refresh)
         else:
+            self._watch_device(None)
             self._clear_and_display_message_in_frames("No device selected.")
 
+    def _select_unavailable_transport(self, address, state):
+        """A device adb can't use yet was picked: show why, and retry it right away if it's a managed endpoint."""
+        self._watch_device(None)
+        message = f"{address} is {state}."
+        if state == "unauthorized":
+            message += "\nAccept the 'Allow USB debugging' prompt on the device."
+        endpoint = next((ep for ep in self.tcp_endpoints if ep["address"] == address), None)
+        if endpoint and endpoint.get("last_error"):
+            message += f"\nLast error: {endpoint['last_error']}"
+
+        if endpoint and self.daemon_client:
+            message += "\nRetrying in the background..."
+            try:
+                self.daemon_client.call("reconnect_endpoints", address=address)
+            except DaemonError as e:
+                print(f"[DEBUG] Could not reconnect {address}: {e}")
+        self._clear_and_display_message_in_frames(message)
+
+    def add_tcp_endpoint(self):
+        address = self.tcp_entry.get().strip()
+        if not address:
+            self.status_label.configure(text_color="orange", text="Enter a TCP device as host:port.")
+            return
+        if not self.daemon_client:
+            self.status_label.configure(text_color="red", text="Daemon not running. Cannot add TCP device.")
+            return
+
+        try:
+            address = self.daemon_client.call("add_endpoint", address=address)["address"]
+        except DaemonError as e:
+            print(f"Error adding TCP device {address}: {e}")
+            self.status_label.configure(text_color="red", text=f"Could not add {address}: {e}")
+            return
+
+        self.tcp_entry.delete(0, "end")
+        self.status_label.configure(text_color="orange", text=f"Connecting to {address}...")
+
+    def _watch_device(self, device_serial):
+        """Ask the daemon to keep only the selected device's inventory live."""
+        if not self.daemon_client or device_serial == self.watched_serial:
+            return
+        try:
+            if self.watched_serial:
+                self.daemon_client.call("unwatch", serial=self.watched_serial)
+            if device_serial:
+                self.daemon_client.call("watch", serial=device_serial)
+            self.watched_serial = device_serial
+        except DaemonError as e:
+            print(f"[DEBUG] Could not change watched device: {e}")
+
+    def _clear_app_frames(self):
+        """Destroy every row and message in both app frames."""
+        for scroll_frame in (self.external_apps_scroll_frame, self.system_apps_scroll_frame):
+            for widget in scroll_frame.winfo_children():
+                if isinstance(widget, customtkinter.CTkFrame) or isinstance(widget, customtkinter.CTkLabel):
+                    widget.destroy()
+        self.app_rows = {'external': {}, 'system': {}}
+        self.empty_list_labels = {'external': None, 'system': None}
+        self.displayed_search_query = None
+
     def _clear_and_display_message_in_frames(self, message):
         """Helper to clear both app frames and display a single message centrally."""
-        # Clear external apps frame
-        for widget in self.external_apps_scroll_frame.winfo_children():
-            if isinstance(widget, customtkinter.CTkFrame) or isinstance(widget, customtkinter.CTkLabel):
-                widget.destroy()
-        # Clear system apps frame
-        for widget in self.system_apps_scroll_frame.winfo_children():
-            if isinstance(widget, customtkinter.CTkFrame) or isinstance(widget, customtkinter.CTkLabel):
-                widget.destroy()
+        self._clear_app_frames()
 
         # Display message in the external apps frame as the primary place
         message_label = customtkinter.CTkLabel(
@@ -355,11 +426,11 @@ class App(customtkinter.CTk):
         )
         message_label.grid(row=0, column=0, padx=5, pady=5, sticky="ew", columnspan=2)
 
-    def _fetch_and_display_apps(self, device_serial):
+    def _fetch_and_display_apps(self, device_serial, refresh=False):
         self._clear_and_display_message_in_frames("Loading apps... This may take a moment.")
         self.update_idletasks()
 
-        self.all_apps_categorized = self.get_installed_apps(device_serial)
+        self.all_apps_categorized = self.get_installed_apps(device_serial, refresh=refresh)
 
         total_apps_found = len(self.all_apps_categorized['external']) + len(self.all_apps_categorized['system'])
 
@@ -373,182 +444,125 @@ class App(customtkinter.CTk):
 
         self._display_filtered_apps()
 
-    def get_installed_apps(self, device_serial):
-        if not self.adb_path:
-            print("[DEBUG] ADB path is None, cannot get installed apps.")
+    def get_installed_apps(self, device_serial, refresh=False):
+        if not self.daemon_client:
+            print("[DEBUG] No daemon connection, cannot get installed apps.")
             return {'external': [], 'system': []}
 
-        all_apps = []
-        adb_command = [self.adb_path, "-s", device_serial, "shell", "pm", "list", "packages", "-f"]
-        print(f"[DEBUG] Running ADB command to list ALL apps: {' '.join(adb_command)}")
         try:
-            process = subprocess.run(adb_command, capture_output=True, text=True, check=False, timeout=60)
-
-            print(f"[DEBUG] ADB list packages stdout (truncated):\n{process.stdout.strip()[:1000]}...")
-            print(f"[DEBUG] ADB list packages stderr:\n{process.stderr.strip()}")
-            print(f"[DEBUG] ADB list packages return code: {process.returncode}")
-
-            if process.returncode != 0:
-                print(f"Error executing 'adb pm list packages': {process.stderr.strip()}")
-                self.status_label.configure(text_color="red",
-                                            text=f"ADB app list error: {process.stderr.strip()[:100]}...")
-                return {'external': [], 'system': []}
-
-            for line in process.stdout.splitlines():
-                if line.startswith("package:"):
-                    parts = line.strip().split("=", 1)
-                    if len(parts) == 2:
-                        apk_path_full = parts[0].replace("package:", "")
-                        package_name = parts[1]
-                        all_apps.append({'package_name': package_name, 'apk_path': apk_path_full})
-
-            external_apps = []
-            system_apps = []
-            for app in all_apps:
-                if app['apk_path'].startswith('/system/app/') or \
-                        app['apk_path'].startswith('/system/priv-app/') or \
-                        app['apk_path'].startswith('/vendor/app/') or \
-                        app['apk_path'].startswith('/product/app/') or \
-                        app['apk_path'].startswith('/data/app/~~/'):
-                    system_apps.append(app)
-                else:
-                    external_apps.append(app)
-
-            print(
-                f"[DEBUG] get_installed_apps returning {len(external_apps)} external and {len(system_apps)} system apps.")
-            return {'external': external_apps, 'system': system_apps}
-
-        except (subprocess.TimeoutExpired) as e:
-            print(f"ADB command 'list packages' timed out: {e}")
-            self.status_label.configure(text_color="red", text="ADB app list command timed out.")
-            return {'external': [], 'system': []}
-        except Exception as e:
-            print(f"An unexpected error occurred while getting installed apps: {e}")
-            self.status_label.configure(text_color="red", text=f"Error getting app list: {e}")
+            return self.daemon_client.call("list_packages", serial=device_serial, refresh=refresh)
+        except DaemonError as e:
+            print(f"An error occurred while getting installed apps: {e}")
+            self.status_label.configure(text_color="red", text=str(e))
             return {'external': [], 'system': []}
 
     def on_search_change(self, event=None):
         self._display_filtered_apps()
 
     def _display_filtered_apps(self):
-        # Clear both scrollable frames
-        for widget in self.external_apps_scroll_frame.winfo_children():
-            if isinstance(widget, customtkinter.CTkFrame) or isinstance(widget, customtkinter.CTkLabel):
-                widget.destroy()
-        for widget in self.system_apps_scroll_frame.winfo_children():
-            if isinstance(widget, customtkinter.CTkFrame) or isinstance(widget, customtkinter.CTkLabel):
-                widget.destroy()
-
-        search_query = self.search_entry.get().lower().strip()
-
-        external_apps_to_display = []
-        system_apps_to_display = []
-
-        # Filter external apps
-        if search_query:
-            for app_info in self.all_apps_categorized.get('external', []):
-                if search_query in app_info['package_name'].lower():
-                    external_apps_to_display.append(app_info)
-        else:
-            external_apps_to_display = list(self.all_apps_categorized.get('external', []))
+        """Rebuild both app lists from scratch; only needed for a new inventory or a new search."""
+        self._clear_app_frames()
+        self.displayed_search_query = self.search_entry.get().lower().strip()
+
+        for category in ('external', 'system'):
+            apps_to_display = [app_info for app_info in self.all_apps_categorized.get(category, [])
+                               if self.displayed_search_query in app_info['package_name'].lower()]
+            apps_to_display.sort(key=lambda app_info: _app_sort_key(_app_key(app_info)))
+            for i, app_info in enumerate(apps_to_display):
+                self.app_rows[category][_app_key(app_info)] = {
+                    "frame": self._create_app_row(category, app_info, i), "index": i}
+            self._update_empty_list_label(category)
+
+    def _apply_diff_to_displayed_apps(self, diff):
+        """Destroy the rows of removed apps and insert rows for added ones that match the current search."""
+        if self.displayed_search_query is None:
+            # The lists aren't on screen (a message is), so there are no rows to patch
+            self._display_filtered_apps()
+            return
 
-        # Filter system apps
-        if search_query:
-            for app_info in self.all_apps_categorized.get('system', []):
-                if search_query in app_info['package_name'].lower():
-                    system_apps_to_display.append(app_info)
-        else:
-            system_apps_to_display = list(self.all_apps_categorized.get('system', []))
-
-        # Sort filtered lists
-        external_apps_to_display.sort(key=lambda x: x['package_name'].lower())
-        system_apps_to_display.sort(key=lambda x: x['package_name'].lower())
-
-        # Populate External Apps Frame
-        if external_apps_to_display:
-            for i, app_info in enumerate(external_apps_to_display):
-                app_frame = customtkinter.CTkFrame(
-                    self.external_apps_scroll_frame,
-                    fg_color="gray75" if i % 2 == 0 else "gray80",
-                    corner_radius=6
-                )
-                app_frame.grid(row=i, column=0, padx=5, pady=3, sticky="ew", columnspan=2)
-
-                app_frame.grid_columnconfigure(0, weight=1)
-                app_frame.grid_columnconfigure(1, weight=0)
-
-                app_name_package_text = f"Package: {app_info['package_name']}\nPath: {app_info['apk_path']}"
-                app_label = customtkinter.CTkLabel(
-                    app_frame,
-                    text=app_name_package_text,
-                    text_color="black",
-                    justify="left",
-                    anchor="w",
-                    wraplength=self.app_list_wraplength
-                )
-                app_label.grid(row=0, column=0, padx=(10, 5), pady=5, sticky="ew")
-
-                delete_button = customtkinter.CTkButton(
-                    app_frame,
-                    text="Delete",
-                    fg_color="red",
-                    hover_color="darkred",
-                    command=lambda pkg=app_info['package_name']: self.confirm_and_delete_app(pkg)
-                )
-                delete_button.grid(row=0, column=1, padx=(5, 10), pady=5, sticky="e")
-        else:
-            message_text = "No matching external apps found." if search_query else "No external apps found."
-            message_label = customtkinter.CTkLabel(
-                self.external_apps_scroll_frame,
-                text=message_text,
-                fg_color="transparent",
-                text_color="gray",
-                wraplength=self.app_list_wraplength + 50
-            )
-            message_label.grid(row=0, column=0, padx=5, pady=5, sticky="ew", columnspan=2)
-
-        # Populate System Apps Frame
-        if system_apps_to_display:
-            for i, app_info in enumerate(system_apps_to_display):
-                app_frame = customtkinter.CTkFrame(
-                    self.system_apps_scroll_frame,
-                    fg_color="gray75" if i % 2 == 0 else "gray80",
-                    corner_radius=6
-                )
-                app_frame.grid(row=i, column=0, padx=5, pady=3, sticky="ew", columnspan=2)
-
-                app_frame.grid_columnconfigure(0, weight=1)
-                app_frame.grid_columnconfigure(1, weight=0)
-
-                app_name_package_text = f"Package: {app_info['package_name']}\nPath: {app_info['apk_path']}"
-                app_label = customtkinter.CTkLabel(
-                    app_frame,
-                    text=app_name_package_text,
-                    text_color="black",
-                    justify="left",
-                    anchor="w",
-                    wraplength=self.app_list_wraplength
-                )
-                app_label.grid(row=0, column=0, padx=(10, 5), pady=5, sticky="ew")
-
-                delete_button = customtkinter.CTkButton(
-                    app_frame,
-                    text="Delete",
-                    fg_color="gray",
-                    hover_color="darkred",
-                    command=lambda pkg=app_info['package_name']: self.confirm_and_delete_app(pkg)
-                )
-                delete_button.grid(row=0, column=1, padx=(5, 10), pady=5, sticky="e")
+        for category in ('external', 'system'):
+            rows = self.app_rows[category]
+            for app_info in diff['removed'].get(category, []):
+                row = rows.pop(_app_key(app_info), None)
+                if row:
+                    row["frame"].destroy()
+
+            added = [app_info for app_info in diff['added'].get(category, [])
+                     if self.displayed_search_query in app_info['package_name'].lower() and
+                     _app_key(app_info) not in rows]
+            for app_info in added:
+                rows[_app_key(app_info)] = {
+                    "frame": self._create_app_row(category, app_info, None), "index": None}
+
+            # Move only the rows whose position changed (new rows, and those below an insert or removal)
+            for i, key in enumerate(sorted(rows, key=_app_sort_key)):
+                row = rows[key]
+                if row["index"] != i:
+                    row["frame"].grid(row=i, column=0, padx=5, pady=3, sticky="ew", columnspan=2)
+                    row["frame"].configure(fg_color="gray75" if i % 2 == 0 else "gray80")
+                    row["index"] = i
+            self._update_empty_list_label(category)
+
+    def _create_app_row(self, category, app_info, index):
+        """Build one app's row in its category's frame; gridded at index unless that is None."""
+        scroll_frame = self.external_apps_scroll_frame if category == 'external' else self.system_apps_scroll_frame
+        app_frame = customtkinter.CTkFrame(
+            scroll_frame,
+            fg_color="gray75" if (index or 0) % 2 == 0 else "gray80",
+            corner_radius=6
+        )
+        if index is not None:
+            app_frame.grid(row=index, column=0, padx=5, pady=3, sticky="ew", columnspan=2)
+
+        app_frame.grid_columnconfigure(0, weight=1)
+        app_frame.grid_columnconfigure(1, weight=0)
+
+        app_name_package_text = f"Package: {app_info['package_name']}\nPath: {app_info['apk_path']}"
+        app_label = customtkinter.CTkLabel(
+            app_frame,
+            text=app_name_package_text,
+            text_color="black",
+            justify="left",
+            anchor="w",
+            wraplength=self.app_list_wraplength
+        )
+        app_label.grid(row=0, column=0, padx=(10, 5), pady=5, sticky="ew")
+
+        delete_button = customtkinter.CTkButton(
+            app_frame,
+            text="Delete",
+            fg_color="red" if category == 'external' else "gray",
+            hover_color="darkred",
+            command=lambda pkg=app_info['package_name']: self.confirm_and_delete_app(pkg)
+        )
+        delete_button.grid(row=0, column=1, padx=(5, 10), pady=5, sticky="e")
+        return app_frame
+
+    def _update_empty_list_label(self, category):
+        """Show the 'no apps' message in a category's frame exactly when it has no rows."""
+        label = self.empty_list_labels[category]
+        if self.app_rows[category]:
+            if label:
+                label.destroy()
+                self.empty_list_labels[category] = None
+            return
+        if label:
+            return
+
+        if self.displayed_search_query:
+            message_text = f"No matching {category} apps found."
         else:
-            message_text = "No matching system apps found." if search_query else "No system apps found."
-            message_label = customtkinter.CTkLabel(
-                self.system_apps_scroll_frame,
-                text=message_text,
-                fg_color="transparent",
-                text_color="gray",
-                wraplength=self.app_list_wraplength + 50
-            )
-            message_label.grid(row=0, column=0, padx=5, pady=5, sticky="ew", columnspan=2)
+            message_text = f"No {category} apps found."
+        scroll_frame = self.external_apps_scroll_frame if category == 'external' else self.system_apps_scroll_frame
+        message_label = customtkinter.CTkLabel(
+            scroll_frame,
+            text=message_text,
+            fg_color="transparent",
+            text_color="gray",
+            wraplength=self.app_list_wraplength + 50
+        )
+        message_label.grid(row=0, column=0, padx=5, pady=5, sticky="ew", columnspan=2)
+        self.empty_list_labels[category] = message_label
 
     def confirm_and_delete_app(self, package_name):
         dialog = customtkinter.CTkToplevel(self)
@@ -612,38 +626,16 @@ class App(customtkinter.CTk):
             ui_update_queue.put({"type": "status", "text": "No device selected for deletion.", "color": "red"})
             return
 
-        if not self.adb_path:
-            ui_update_queue.put({"type": "status", "text": "ADB not found. Cannot delete.", "color": "red"})
+        if not self.daemon_client:
+            ui_update_queue.put({"type": "status", "text": "Daemon not running. Cannot delete.", "color": "red"})
             return
 
         try:
-            print(f"[DEBUG_BACKGROUND] Attempting to uninstall {package_name} from {selected_device_serial}...")
-            command = [self.adb_path, "-s", selected_device_serial, "uninstall", package_name]
-            process = subprocess.run(command, capture_output=True, text=True, check=False, timeout=60)
-
-            print(f"[DEBUG_BACKGROUND] Uninstall stdout:\n{process.stdout.strip()}")
-            print(f"[DEBUG_BACKGROUND] Uninstall stderr:\n{process.stderr.strip()}")
-            print(f"[DEBUG_BACKGROUND] Uninstall return code: {process.returncode}")
-
-            if process.returncode == 0 and "Success" in process.stdout:
-                ui_update_queue.put(
-                    {"type": "status", "text": f"Successfully deleted {package_name}!", "color": "green"})
-                ui_update_queue.put({"type": "refresh_apps"})
-                print(f"Uninstallation successful for {package_name}.")
-            else:
-                error_message = process.stderr.strip() if process.stderr else process.stdout.strip() if process.stdout else "Unknown error."
-                if not error_message: error_message = "Failed with no specific output."
-                ui_update_queue.put(
-                    {"type": "status", "text": f"Failed to delete {package_name}: {error_message[:100]}...",
-                     "color": "red"})
-                print(
-                    f"Uninstallation failed for {package_name}. Full Stderr: {process.stderr}, Full Stdout: {process.stdout}")
-
-        except (subprocess.TimeoutExpired) as e:
-            ui_update_queue.put(
-                {"type": "status", "text": f"Error deleting {package_name}: Command timed out.", "color": "red"})
-            print(f"Error during uninstall command for {package_name}: {e}")
-        except Exception as e:
+            # The uninstall itself runs on the daemon's job queue; its result arrives as a job_finished event
+            job = self.daemon_client.call("execute", serial=selected_device_serial, action="uninstall",
+                                          package=package_name)
+            print(f"[DEBUG_BACKGROUND] Queued uninstall of {package_name} as job {job['job_id']}.")
+        except DaemonError as e:
             ui_update_queue.put(
                 {"type": "status", "text": f"An unexpected error occurred during deletion: {e}", "color": "red"})
             print(f"An unexpected error occurred during uninstallation of {package_name}: {e}")
@@ -0,0 +1,260 @@
+"""
+Managed list of adb-over-TCP endpoints (wireless / network-attached devices).
+
+Connects run in parallel on a bounded thread pool, connected endpoints get a
+keepalive probe on a schedule, and dropped transports are disconnected and
+retried with exponential backoff. All adb traffic goes through adb_utils, so
+the manager can be exercised against a fake adb binary (or a fake adb server
+via ANDROID_ADB_SERVER_PORT).
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import adb_utils
+
+DEFAULT_ADB_TCP_PORT = 5555
+MAX_PARALLEL_CONNECTS = 4
+CONNECT_TIMEOUT = 10  # seconds
+PROBE_TIMEOUT = 5  # seconds
+HEALTH_CHECK_INTERVAL = 15  # seconds between keepalive probes of a connected endpoint
+RECONNECT_BACKOFF_BASE = 2  # seconds before the first retry, doubled after each failure
+RECONNECT_BACKOFF_MAX = 60
+DEFAULT_ENDPOINTS_FILE = os.path.join(os.path.expanduser("~"), ".adb_app_manager_endpoints.json")
+
+STATUS_CONNECTING = "connecting"
+STATUS_CONNECTED = "connected"
+STATUS_OFFLINE = "offline"
+STATUS_UNAUTHORIZED = "unauthorized"  # transport is up but the device hasn't accepted this host's key
+
+
+def normalize_endpoint(address):
+    """Turn 'host' or 'host:port' into 'host:port', raising ValueError if it isn't one."""
+    address = str(address).strip()
+    host, sep, port = address.rpartition(":")
+    if not sep:
+        host, port = address, str(DEFAULT_ADB_TCP_PORT)
+    if not host or not port.isdigit() or not 0 < int(port) < 65536:
+        raise ValueError(f"Invalid TCP endpoint: {address}")
+    return f"{host}:{int(port)}"
+
+
+class Endpoint:
+    def __init__(self, address):
+        self.address = address
+        self.status = STATUS_OFFLINE
+        self.last_error = None
+        self.failures = 0
+        self.next_attempt = 0.0  # time.monotonic() of the next connect attempt
+        self.next_probe = 0.0  # time.monotonic() of the next keepalive probe
+        self.busy = False  # a connect or probe is in flight
+        self.removed = False  # dropped from the list; disconnect once the in-flight work is done
+
+    def to_dict(self):
+        retry_in = None
+        if self.status == STATUS_OFFLINE:
+            retry_in = round(max(self.next_attempt - time.monotonic(), 0), 1)
+        return {"address": self.address, "status": self.status, "last_error": self.last_error,
+                "failures": self.failures, "retry_in": retry_in}
+
+
+class ConnectionManager:
+    """
+    Keeps a set of TCP endpoints connected. Call tick() periodically; it starts
+    whatever connects and probes are due. on_change(endpoints) is called with the
+    new status list whenever it changes, on_transport_change(address, status)
+    whenever an endpoint's status settles on a new value (connected, unauthorized, offline).
+    """
+
+    def __init__(self, adb_path, endpoints_file=None, max_parallel=MAX_PARALLEL_CONNECTS,
+                 health_interval=HEALTH_CHECK_INTERVAL, on_change=None, on_transport_change=None):
+        self.adb_path = adb_path
+        self.endpoints_file = endpoints_file
+        self.health_interval = health_interval
+        self.on_change = on_change
+        self.on_transport_change = on_transport_change
+
+        self._endpoints = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_parallel, thread_name_prefix="adb-tcp")
+        self._shut_down = False
+
+        for address in self._load_endpoints():
+            self._endpoints[address] = Endpoint(address)
+
+    # --- Endpoint list ---
+    def _load_endpoints(self):
+        if not self.endpoints_file or not os.path.exists(self.endpoints_file):
+            return []
+        try:
+            with open(self.endpoints_file, "r", encoding="utf-8") as f:
+                return [normalize_endpoint(address) for address in json.load(f)]
+        except (OSError, ValueError, TypeError) as e:
+            print(f"[DEBUG_TCP] Could not load TCP endpoints from {self.endpoints_file}: {e}")
+            return []
+
+    def _save_endpoints(self):
+        if not self.endpoints_file:
+            return
+        with self._lock:
+            addresses = sorted(self._endpoints)
+        try:
+            with open(self.endpoints_file, "w", encoding="utf-8") as f:
+                json.dump(addresses, f, indent=2)
+        except OSError as e:
+            print(f"[DEBUG_TCP] Could not save TCP endpoints to {self.endpoints_file}: {e}")
+
+    def list_endpoints(self):
+        with self._lock:
+            return [self._endpoints[address].to_dict() for address in sorted(self._endpoints)]
+
+    def add_endpoint(self, address):
+        address = normalize_endpoint(address)
+        with self._lock:
+            if address not in self._endpoints:
+                self._endpoints[address] = Endpoint(address)
+        self._save_endpoints()
+        self.tick()
+        return address
+
+    def remove_endpoint(self, address):
+        address = normalize_endpoint(address)
+        with self._lock:
+            endpoint = self._endpoints.pop(address, None)
+            if endpoint is None:
+                return False
+            endpoint.removed = True
+            # A connect still in flight could re-create the transport after our disconnect,
+            # so in that case _finish disconnects once it is done
+            disconnect_now = not endpoint.busy
+        self._save_endpoints()
+        if disconnect_now:
+            self._submit(self._disconnect, address)
+        self._changed()
+        return True
+
+    def reconnect(self, address=None):
+        """Retry offline endpoints (or just one) now instead of waiting out their backoff, and re-probe the rest."""
+        with self._lock:
+            for endpoint in self._endpoints.values():
+                if address not in (None, endpoint.address):
+                    continue
+                if endpoint.status == STATUS_OFFLINE:
+                    endpoint.next_attempt = 0.0
+                else:
+                    endpoint.next_probe = 0.0
+        self.tick()
+
+    # --- Scheduling ---
+    def tick(self):
+        """Start every connect or keepalive probe that is due."""
+        now = time.monotonic()
+        to_connect = []
+        to_probe = []
+        with self._lock:
+            for endpoint in self._endpoints.values():
+                if endpoint.busy:
+                    continue
+                if endpoint.status == STATUS_OFFLINE and endpoint.next_attempt <= now:
+                    endpoint.busy = True
+                    endpoint.status = STATUS_CONNECTING
+                    to_connect.append(endpoint)
+                elif endpoint.status in (STATUS_CONNECTED, STATUS_UNAUTHORIZED) and endpoint.next_probe <= now:
+                    endpoint.busy = True
+                    to_probe.append(endpoint)
+
+        # The pool size bounds how many of these talk to adb at once
+        for endpoint in to_connect:
+            self._submit(self._connect, endpoint)
+        for endpoint in to_probe:
+            self._submit(self._probe, endpoint)
+        if to_connect:
+            self._changed()
+
+    def shutdown(self):
+        with self._lock:
+            self._shut_down = True
+            self._executor.shutdown(wait=False)
+
+    def _submit(self, fn, *args):
+        """Run fn on the pool; a no-op once shutdown() was called (the daemon loop or an RPC may still tick)."""
+        with self._lock:
+            if self._shut_down:
+                return None
+            return self._executor.submit(fn, *args)
+
+    # --- Workers (run on the pool) ---
+    def _connect(self, endpoint):
+        try:
+            process = adb_utils.run_adb(self.adb_path, ["connect", endpoint.address], timeout=CONNECT_TIMEOUT)
+            output = f"{process.stdout.strip()} {process.stderr.strip()}".strip()
+            # adb prints "connected to" / "already connected to" on success and exits 0 even on failure
+            ok = process.returncode == 0 and "connected to" in output.lower()
+        except adb_utils.AdbError as e:
+            ok, output = False, str(e)
+        print(f"[DEBUG_TCP] Connect {endpoint.address}: {'ok' if ok else 'failed'} ({output})")
+        if ok:
+            self._finish(endpoint, STATUS_CONNECTED, None)
+        else:
+            self._finish(endpoint, STATUS_OFFLINE, output or "Connection failed.")
+
+    def _probe(self, endpoint):
+        try:
+            process = adb_utils.run_adb(self.adb_path, ["-s", endpoint.address, "shell", "echo", "ok"],
+                                        timeout=PROBE_TIMEOUT)
+            ok = process.returncode == 0 and process.stdout.strip() == "ok"
+            error = None if ok else (process.stderr.strip() or process.stdout.strip() or "Keepalive probe failed.")
+        except adb_utils.AdbError as e:
+            ok, error = False, str(e)
+
+        if ok:
+            self._finish(endpoint, STATUS_CONNECTED, None)
+        elif "unauthorized" in error.lower():
+            # Leave the transport up, disconnecting would dismiss the authorization prompt on the device
+            print(f"[DEBUG_TCP] {endpoint.address} is connected but unauthorized: {error}")
+            self._finish(endpoint, STATUS_UNAUTHORIZED, error)
+        else:
+            print(f"[DEBUG_TCP] Keepalive probe failed for {endpoint.address}: {error}")
+            # Drop the stale transport so it doesn't linger as 'offline' in 'adb devices'
+            self._disconnect(endpoint.address)
+            self._finish(endpoint, STATUS_OFFLINE, error)
+
+    def _disconnect(self, address):
+        try:
+            adb_utils.run_adb(self.adb_path, ["disconnect", address], timeout=CONNECT_TIMEOUT)
+        except adb_utils.AdbError as e:
+            print(f"[DEBUG_TCP] Disconnect {address} failed: {e}")
+
+    def _finish(self, endpoint, status, error):
+        now = time.monotonic()
+        with self._lock:
+            endpoint.busy = False
+            removed = endpoint.removed
+        if removed:
+            # remove_endpoint left the disconnect to us so it can't race this connect
+            self._disconnect(endpoint.address)
+            return
+        with self._lock:
+            old_status = endpoint.status
+            endpoint.status = status
+            endpoint.last_error = error
+            if status == STATUS_OFFLINE:
+                endpoint.failures += 1
+                backoff = RECONNECT_BACKOFF_BASE * 2 ** (endpoint.failures - 1)
+                endpoint.next_attempt = now + min(backoff, RECONNECT_BACKOFF_MAX)
+            else:
+                endpoint.failures = 0
+                # 'adb connect' reports success for unauthorized devices too, so probe right after it
+                endpoint.next_probe = now if old_status == STATUS_CONNECTING else now + self.health_interval
+
+        if status == old_status and status != STATUS_OFFLINE:
+            return  # routine probe with the same outcome, nothing to report
+        self._changed()
+        if status != old_status and self.on_transport_change:
+            self.on_transport_change(endpoint.address, status)
+
+    def _changed(self):
+        if self.on_change:
+            self.on_change(self.list_endpoints())
@@ -0,0 +1,195 @@
+import os
+import sys
+import tempfile
+import textwrap
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import adb_utils  # noqa: E402
+
+LISTING_COMMAND = "pm list packages -f"
+
+# Stand-in for the adb binary serving listing.txt from FAKE_ADB_STATE. Marker files there change its behaviour:
+# detect_fails = compressor detection errors out, no_gzip = the device has no gzip,
+# corrupt / truncated = exec-out sends broken gzip data, hang = every call stalls.
+# Every call is appended to calls.log as "<args...>".
+FAKE_ADB = textwrap.dedent('''\
+    import gzip, os, sys, time
+    state = os.environ["FAKE_ADB_STATE"]
+    args = sys.argv[1:]
+    if args[:1] == ["-s"]:
+        args = args[2:]
+    with open(os.path.join(state, "calls.log"), "a") as log:
+        log.write(" ".join(args) + "\\n")
+
+    def mode(name):
+        return os.path.exists(os.path.join(state, name))
+
+    with open(os.path.join(state, "listing.txt"), "rb") as f:
+        listing = f.read()
+    out = sys.stdout.buffer
+    if mode("hang"):
+        time.sleep(30)
+
+    if args[0] == "shell" and args[1].startswith("for c in"):
+        if mode("detect_fails"):
+            sys.stderr.write("error: closed\\n")
+            sys.exit(1)
+        if not mode("no_gzip"):
+            print("gzip")
+    elif args[0] == "shell":
+        out.write(listing.replace(b"\\n", b"\\r\\n"))  # adb shell's pty turns \\n into \\r\\n
+    elif args[0] == "exec-out":
+        # exec-out has no stderr channel: unless the command drops it, pm's warnings land in the gzip bytes
+        data = b"" if "2>/dev/null" in args[1] else b"WARNING: linker: unused DT entry\\n"
+        data += gzip.compress(listing)
+        if mode("corrupt"):
+            data = b"/system/bin/sh: gzip: inaccessible or not found\\n"
+        if mode("truncated"):
+            data = data[:len(data) // 2]
+        out.write(data)
+''')
+
+
+def make_listing(count):
+    lines = []
+    for i in range(count):
+        if i % 3:
+            lines.append(f"package:/data/app/~~abc{i}==/com.example.app{i}-1/base.apk=com.example.app{i}")
+        else:
+            lines.append(f"package:/system/priv-app/Sys{i}/Sys{i}.apk=com.android.sys{i}")
+    return "\n".join(lines) + "\n"
+
+
+@unittest.skipIf(sys.platform == "win32", "the fake adb is a script run through a shebang")
+class StreamShellLinesTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.state = self._tmp.name
+        self.adb_path = os.path.join(self.state, "adb")
+        with open(self.adb_path, "w") as f:
+            f.write(f"#!{sys.executable}\n" + FAKE_ADB)
+        os.chmod(self.adb_path, 0o755)
+
+        self.listing = make_listing(3000)
+        with open(os.path.join(self.state, "listing.txt"), "w") as f:
+            f.write(self.listing)
+
+        self._saved_env = dict(os.environ)
+        os.environ["FAKE_ADB_STATE"] = self.state
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self._saved_env)
+        self._tmp.cleanup()
+
+    def set_mode(self, name, present=True):
+        path = os.path.join(self.state, name)
+        if present:
+            open(path, "w").close()
+        elif os.path.exists(path):
+            os.remove(path)
+
+    def calls(self, command=None):
+        path = os.path.join(self.state, "calls.log")
+        if not os.path.exists(path):
+            return []
+        with open(path) as f:
+            calls = [line.rstrip("\n") for line in f]
+        return [call for call in calls if command is None or call.split(" ", 1)[0] == command]
+
+    def detections(self):
+        return [call for call in self.calls("shell") if call.startswith("shell for c in")]
+
+    def stream(self, **kwargs):
+        stats = {}
+        lines = list(adb_utils.stream_shell_lines(self.adb_path, "S1", LISTING_COMMAND, timeout=10, stats=stats,
+                                                  **kwargs))
+        return lines, stats
+
+    def test_plain_and_gzip_output_match(self):
+        expected = self.listing.splitlines()
+
+        plain, plain_stats = self.stream(compress=False)
+        compressed, compressed_stats = self.stream()
+
+        self.assertEqual(plain, expected)
+        self.assertEqual(compressed, expected)
+        self.assertFalse(plain_stats["compressed"])
+        self.assertTrue(compressed_stats["compressed"])
+        self.assertLess(compressed_stats["wire_bytes"], compressed_stats["text_bytes"])
+        self.assertEqual(compressed_stats["saved_bytes"],
+                         compressed_stats["text_bytes"] - compressed_stats["wire_bytes"])
+        exec_out, = self.calls("exec-out")
+        self.assertIn("2>/dev/null | gzip -c", exec_out)
+
+    def test_corrupt_output_before_first_line_falls_back_to_plain_text(self):
+        self.set_mode("corrupt")
+
+        lines, stats = self.stream()
+
+        self.assertEqual(lines, self.listing.splitlines())
+        self.assertFalse(stats["compressed"])
+        self.assertEqual(len(self.calls("exec-out")), 1)
+        self.assertIn(f"shell {LISTING_COMMAND}", self.calls("shell"))
+
+    def test_truncated_output_after_some_lines_raises(self):
+        self.set_mode("truncated")
+        seen = []
+
+        with self.assertRaises(adb_utils.CompressedStreamError):
+            for line in adb_utils.stream_shell_lines(self.adb_path, "S1", LISTING_COMMAND, timeout=10):
+                seen.append(line)
+
+        # Lines were already handed out, so the stream must not quietly restart underneath the caller
+        self.assertTrue(seen)
+        self.assertEqual(seen, self.listing.splitlines()[:len(seen)])
+        self.assertNotIn(f"shell {LISTING_COMMAND}", self.calls("shell"))
+
+    def test_truncated_output_makes_get_installed_apps_list_again_uncompressed(self):
+        self.set_mode("truncated")
+
+        apps = adb_utils.get_installed_apps(self.adb_path, "S1")
+
+        expected = adb_utils.categorize_apps(adb_utils.parse_package_list(self.listing.splitlines()))
+        self.assertEqual(apps, expected)
+        self.assertEqual(len(apps["system"]), 1000)
+        self.assertEqual(len(self.calls("exec-out")), 1)
+        self.assertIn(f"shell {LISTING_COMMAND}", self.calls("shell"))
+
+    def test_failed_detection_is_retried_and_success_is_cached(self):
+        self.set_mode("detect_fails")
+        _, stats = self.stream()
+        self.assertFalse(stats["compressed"])
+
+        self.set_mode("detect_fails", present=False)
+        _, stats = self.stream()
+        self.assertTrue(stats["compressed"])
+        self.assertEqual(len(self.detections()), 2)
+
+        self.stream()
+        self.assertEqual(len(self.detections()), 2)
+
+    def test_missing_gzip_is_cached(self):
+        self.set_mode("no_gzip")
+
+        for _ in range(2):
+            lines, stats = self.stream()
+            self.assertEqual(lines, self.listing.splitlines())
+            self.assertFalse(stats["compressed"])
+        self.assertEqual(len(self.detections()), 1)
+        self.assertEqual(self.calls("exec-out"), [])
+
+    def test_timeout_kills_the_stream(self):
+        self.set_mode("hang")
+        started = time.monotonic()
+
+        with self.assertRaises(adb_utils.AdbError):
+            list(adb_utils.stream_shell_lines(self.adb_path, "S1", LISTING_COMMAND, timeout=0.5, compress=False))
+        self.assertLess(time.monotonic() - started, 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
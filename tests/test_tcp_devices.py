@@ -0,0 +1,223 @@
+import json
+import os
+import sys
+import tempfile
+import textwrap
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tcp_devices  # noqa: E402
+
+# Stand-in for the adb binary. Device behaviour is driven by marker files in FAKE_ADB_STATE:
+# <addr>.up = reachable, <addr>.unauth = reachable but unauthorized, <addr>.conn = transport exists.
+# Every call is appended to calls.log as "<start> <end> <args...>".
+FAKE_ADB = textwrap.dedent('''\
+    import os, sys, time
+    state = os.environ["FAKE_ADB_STATE"]
+    args = sys.argv[1:]
+    serial = None
+    if args[:1] == ["-s"]:
+        serial, args = args[1], args[2:]
+    start = time.monotonic()
+
+    def marker(address, kind):
+        return os.path.join(state, address + "." + kind)
+
+    if args[0] == "connect":
+        time.sleep(float(os.environ.get("FAKE_ADB_CONNECT_DELAY", "0")))
+        if os.path.exists(marker(args[1], "up")):
+            open(marker(args[1], "conn"), "w").close()
+            print("connected to " + args[1])
+        else:
+            print("failed to connect to '%s': Connection refused" % args[1])
+    elif args[0] == "disconnect":
+        if os.path.exists(marker(args[1], "conn")):
+            os.remove(marker(args[1], "conn"))
+        print("disconnected " + args[1])
+    elif args[0] == "shell":
+        if not (os.path.exists(marker(serial, "up")) and os.path.exists(marker(serial, "conn"))):
+            sys.stderr.write("error: device offline\\n")
+            sys.exit(1)
+        if os.path.exists(marker(serial, "unauth")):
+            sys.stderr.write("error: device unauthorized.\\n")
+            sys.exit(1)
+        print("ok")
+
+    with open(os.path.join(state, "calls.log"), "a") as log:
+        log.write("%f %f %s\\n" % (start, time.monotonic(), " ".join(args)))
+''')
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+@unittest.skipIf(sys.platform == "win32", "the fake adb is a script run through a shebang")
+class ConnectionManagerTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.state = self._tmp.name
+        self.adb_path = os.path.join(self.state, "adb")
+        with open(self.adb_path, "w") as f:
+            f.write(f"#!{sys.executable}\n" + FAKE_ADB)
+        os.chmod(self.adb_path, 0o755)
+        self.endpoints_file = os.path.join(self.state, "endpoints.json")
+
+        self._saved_env = dict(os.environ)
+        os.environ["FAKE_ADB_STATE"] = self.state
+        os.environ["FAKE_ADB_CONNECT_DELAY"] = "0"
+        self.transport_changes = []
+        self.manager = None
+
+    def tearDown(self):
+        if self.manager:
+            self.manager.shutdown()
+        os.environ.clear()
+        os.environ.update(self._saved_env)
+        self._tmp.cleanup()
+
+    def make_manager(self, **kwargs):
+        self.manager = tcp_devices.ConnectionManager(
+            self.adb_path, endpoints_file=self.endpoints_file,
+            on_transport_change=lambda address, status: self.transport_changes.append((address, status)),
+            **kwargs)
+        return self.manager
+
+    def set_device(self, address, kind, present=True):
+        path = os.path.join(self.state, f"{address}.{kind}")
+        if present:
+            open(path, "w").close()
+        elif os.path.exists(path):
+            os.remove(path)
+
+    def calls(self, command=None):
+        path = os.path.join(self.state, "calls.log")
+        if not os.path.exists(path):
+            return []
+        calls = []
+        with open(path) as f:
+            for line in f:
+                start, end, args = line.split(" ", 2)
+                if command is None or args.split()[0] == command:
+                    calls.append((float(start), float(end), args.strip()))
+        return calls
+
+    def statuses(self):
+        return {endpoint["address"]: endpoint["status"] for endpoint in self.manager.list_endpoints()}
+
+    def test_connects_run_in_parallel_with_bounded_concurrency(self):
+        os.environ["FAKE_ADB_CONNECT_DELAY"] = "0.3"
+        addresses = [f"10.0.0.{i}:5555" for i in range(1, 7)]
+        for address in addresses:
+            self.set_device(address, "up")
+        manager = self.make_manager(max_parallel=3, health_interval=60)
+
+        for address in addresses:
+            manager.add_endpoint(address)
+
+        self.assertTrue(wait_for(lambda: set(self.statuses().values()) == {tcp_devices.STATUS_CONNECTED}))
+        connects = self.calls("connect")
+        self.assertEqual(len(connects), 6)
+        peak = max(sum(1 for s, e, _ in connects if s <= start < e) for start, _, _ in connects)
+        self.assertGreater(peak, 1)
+        self.assertLessEqual(peak, 3)
+        with open(self.endpoints_file) as f:
+            self.assertEqual(json.load(f), sorted(addresses))
+
+    def test_failed_probe_disconnects_and_backs_off(self):
+        address = "10.0.0.1:5555"
+        self.set_device(address, "up")
+        manager = self.make_manager(health_interval=0.1)
+        manager.add_endpoint(address)
+        self.assertTrue(wait_for(lambda: self.statuses()[address] == tcp_devices.STATUS_CONNECTED))
+
+        self.set_device(address, "up", present=False)
+
+        def ticked_offline():
+            manager.tick()
+            return self.statuses()[address] == tcp_devices.STATUS_OFFLINE
+        self.assertTrue(wait_for(ticked_offline))
+
+        self.assertTrue(any(args == f"disconnect {address}" for _, _, args in self.calls("disconnect")))
+        self.assertFalse(os.path.exists(os.path.join(self.state, f"{address}.conn")))
+        endpoint = manager.list_endpoints()[0]
+        self.assertEqual(endpoint["failures"], 1)
+        self.assertGreater(endpoint["retry_in"], 0)
+        self.assertLessEqual(endpoint["retry_in"], tcp_devices.RECONNECT_BACKOFF_BASE)
+        self.assertIn((address, tcp_devices.STATUS_OFFLINE), self.transport_changes)
+
+        # Still inside the backoff window: ticking must not reconnect yet
+        connects_before = len(self.calls("connect"))
+        manager.tick()
+        time.sleep(0.2)
+        self.assertEqual(len(self.calls("connect")), connects_before)
+
+    def test_remove_endpoint_disconnects_and_forgets_it(self):
+        address = "10.0.0.1:5555"
+        self.set_device(address, "up")
+        manager = self.make_manager(health_interval=60)
+        manager.add_endpoint(address)
+        self.assertTrue(wait_for(lambda: self.statuses()[address] == tcp_devices.STATUS_CONNECTED))
+
+        self.assertTrue(manager.remove_endpoint(address))
+
+        self.assertTrue(wait_for(lambda: self.calls("disconnect")))
+        self.assertEqual(manager.list_endpoints(), [])
+        with open(self.endpoints_file) as f:
+            self.assertEqual(json.load(f), [])
+        self.assertFalse(manager.remove_endpoint(address))
+
+    def test_remove_during_connect_disconnects_after_it(self):
+        os.environ["FAKE_ADB_CONNECT_DELAY"] = "0.5"
+        address = "10.0.0.1:5555"
+        self.set_device(address, "up")
+        manager = self.make_manager(health_interval=60)
+        manager.add_endpoint(address)
+        time.sleep(0.1)  # connect is now in flight
+
+        manager.remove_endpoint(address)
+
+        self.assertTrue(wait_for(lambda: self.calls("disconnect")))
+        (connect_start, connect_end, _), = self.calls("connect")
+        (disconnect_start, _, _), = self.calls("disconnect")
+        self.assertGreaterEqual(disconnect_start, connect_end)
+        self.assertFalse(os.path.exists(os.path.join(self.state, f"{address}.conn")))
+
+    def test_unauthorized_endpoint_stays_connected(self):
+        address = "10.0.0.1:5555"
+        self.set_device(address, "up")
+        self.set_device(address, "unauth")
+        manager = self.make_manager(health_interval=60)
+        manager.add_endpoint(address)
+
+        def ticked_unauthorized():
+            manager.tick()
+            return self.statuses()[address] == tcp_devices.STATUS_UNAUTHORIZED
+        self.assertTrue(wait_for(ticked_unauthorized))
+        self.assertEqual(self.calls("disconnect"), [])
+
+        # Once the user accepts the prompt, reconnect() re-probes right away
+        self.set_device(address, "unauth", present=False)
+        manager.reconnect(address)
+        self.assertTrue(wait_for(lambda: self.statuses()[address] == tcp_devices.STATUS_CONNECTED))
+
+    def test_tick_and_remove_after_shutdown_do_nothing(self):
+        address = "10.0.0.1:5555"
+        manager = self.make_manager()
+        manager.shutdown()
+
+        manager.add_endpoint(address)
+        manager.tick()
+        self.assertTrue(manager.remove_endpoint(address))
+        self.assertEqual(self.calls(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()